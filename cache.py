@@ -0,0 +1,78 @@
+import time
+from collections import OrderedDict
+
+_MISSING = object()
+
+
+class TTLCache:
+    """
+    Size-bounded LRU cache whose entries also expire after 'ttl' seconds.
+    Keys are tuples whose first element names the cached query, so a whole
+    query family can be invalidated with invalidate_prefix().
+    """
+
+    def __init__(self, maxsize: int = 2048, ttl: float = 600):
+        self.maxsize = max(1, maxsize)
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # Bumped on every invalidation; see set().
+        self.version = 0
+        self._entries: OrderedDict[tuple, tuple[float, object]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: tuple, default=_MISSING):
+        """Returns the cached value, or 'default' (a private sentinel) on a miss."""
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires_at, value = entry
+            if expires_at > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+            del self._entries[key]
+        self.misses += 1
+        return default
+
+    def set(self, key: tuple, value, version: int | None = None, ttl: float | None = None):
+        """
+        Stores a value. Passing the 'version' read before the value was fetched drops
+        the write if an invalidation happened in between, so a read racing a write
+        cannot cache the pre-write value.
+        """
+        if version is not None and version != self.version:
+            return
+        self._entries[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, key: tuple):
+        self.version += 1
+        self._entries.pop(key, None)
+
+    def invalidate_prefix(self, *prefix):
+        """Drops every entry whose key starts with 'prefix'."""
+        self.version += 1
+        size = len(prefix)
+        for key in [key for key in self._entries if key[:size] == prefix]:
+            del self._entries[key]
+
+    def clear(self):
+        self.version += 1
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
@@ -0,0 +1,61 @@
+class CatalogCounts:
+    """
+    In-memory row counts per table and per (table, category).
+
+    Values are learned either one at a time (a single count query) or all at once
+    through replace(), after which the table's category map is complete and a
+    category that is missing from it simply has no rows. Writes keep the numbers
+    current with adjust(), or drop them with invalidate() when the exact change
+    is not known.
+    """
+
+    def __init__(self):
+        self._totals: dict[str, int] = {}
+        self._categories: dict[str, dict[str, int]] = {}
+        self._complete: set[str] = set()
+        # Bumped on every invalidation so a count query that raced a write is not stored.
+        self.version = 0
+
+    def total(self, table: str) -> int | None:
+        return self._totals.get(table)
+
+    def category(self, table: str, category: str) -> int | None:
+        counts = self._categories.get(table, {})
+        if table in self._complete:
+            return counts.get(category, 0)
+        return counts.get(category)
+
+    def set_total(self, table: str, count: int, version: int | None = None):
+        if version is None or version == self.version:
+            self._totals[table] = count
+
+    def set_category(self, table: str, category: str, count: int, version: int | None = None):
+        if version is None or version == self.version:
+            self._categories.setdefault(table, {})[category] = count
+
+    def replace(self, table: str, category_counts: dict[str, int], version: int | None = None):
+        """Installs a full recount of 'table' ({category: rows}, None for uncategorised rows)."""
+        if version is not None and version != self.version:
+            return
+        self._categories[table] = {
+            category: count for category, count in category_counts.items() if category is not None
+        }
+        self._totals[table] = sum(category_counts.values())
+        self._complete.add(table)
+
+    def adjust(self, table: str, category: str | None, delta: int):
+        """Applies a known change in row count to every number that is currently held."""
+        if table in self._totals:
+            self._totals[table] += delta
+        counts = self._categories.get(table)
+        if category is not None and counts is not None:
+            if category in counts:
+                counts[category] += delta
+            elif table in self._complete:
+                counts[category] = delta
+
+    def invalidate(self, table: str):
+        self.version += 1
+        self._totals.pop(table, None)
+        self._categories.pop(table, None)
+        self._complete.discard(table)
@@ -0,0 +1,242 @@
+import os
+import json
+import time
+import asyncio
+import hashlib
+import logging
+import contextlib
+from collections import deque
+from urllib.parse import urlsplit
+
+logger = logging.getLogger(__name__)
+
+# Outcomes of a conditional listing fetch
+LISTING_CHANGED = "changed"
+LISTING_UNCHANGED = "unchanged"
+LISTING_FAILED = "failed"
+
+# Entry kinds returned by a CrawlScheduler visit callback
+CRAWL_RESULT = "result"
+CRAWL_FOLLOW = "follow"
+
+
+def content_hash(content: str) -> str:
+    """Returns a stable fingerprint for a listing body."""
+    return hashlib.sha256(content.encode("utf-8", errors="replace")).hexdigest()
+
+
+class CrawlStateStore:
+    """
+    Remembers the ETag, Last-Modified and content hash of every directory listing
+    that was successfully crawled, so the next refresh can send conditional requests
+    and skip listings that did not change. State is kept in a small JSON file.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._entries: dict[str, dict] = {}
+        self._loaded = False
+
+    def load(self):
+        """Loads the state file once. A missing or corrupt file just means a full crawl."""
+        if self._loaded:
+            return
+        self._loaded = True
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self._entries = json.load(f)
+            logger.info(f"Loaded crawl state for {len(self._entries)} listings from {self.path}.")
+        except Exception as e:
+            logger.warning(f"Could not read crawl state from {self.path}, starting fresh: {e}")
+            self._entries = {}
+
+    def get(self, url: str) -> dict | None:
+        return self._entries.get(url)
+
+    def set(self, url: str, fingerprint: dict):
+        self._entries[url] = fingerprint
+
+    def forget(self, url: str):
+        self._entries.pop(url, None)
+
+    def save(self):
+        """Writes the state atomically so a crash never leaves a half-written file."""
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self._entries, f)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            logger.error(f"Could not save crawl state to {self.path}: {e}", exc_info=True)
+
+
+def conditional_headers(fingerprint: dict | None) -> dict:
+    """Builds If-None-Match / If-Modified-Since headers from a stored fingerprint."""
+    headers = {}
+    if not fingerprint:
+        return headers
+    if fingerprint.get("etag"):
+        headers["If-None-Match"] = fingerprint["etag"]
+    if fingerprint.get("last_modified"):
+        headers["If-Modified-Since"] = fingerprint["last_modified"]
+    return headers
+
+
+class AdaptiveLimiter:
+    """
+    Concurrency limit for a single host that adapts to its latency (AIMD):
+    the limit grows by roughly one slot per round of fast responses and is
+    halved, at most once per round trip, when the average latency exceeds
+    the target.
+    """
+
+    def __init__(self, max_limit: int, min_limit: int = 1, latency_target: float = 2.0):
+        self.max_limit = max(1, max_limit)
+        self.min_limit = max(1, min(min_limit, self.max_limit))
+        self.latency_target = latency_target
+        self.limit = float(self.max_limit)
+        self.in_flight = 0
+        self.avg_latency: float | None = None
+        self._last_decrease = 0.0
+        self._waiters: deque[asyncio.Future] = deque()
+
+    async def acquire(self):
+        while self.in_flight >= int(self.limit):
+            fut = asyncio.get_running_loop().create_future()
+            self._waiters.append(fut)
+            try:
+                await fut
+            except asyncio.CancelledError:
+                # Pass the wake-up on if we were woken and cancelled at the same time.
+                if fut.done() and not fut.cancelled():
+                    self._wake()
+                else:
+                    with contextlib.suppress(ValueError):
+                        self._waiters.remove(fut)
+                raise
+        self.in_flight += 1
+
+    def release(self, latency: float):
+        self.in_flight -= 1
+        self._record(latency)
+        self._wake()
+
+    def _record(self, latency: float):
+        if self.avg_latency is None:
+            self.avg_latency = latency
+        else:
+            self.avg_latency = 0.8 * self.avg_latency + 0.2 * latency
+
+        now = time.monotonic()
+        if self.avg_latency > self.latency_target:
+            if now - self._last_decrease >= self.avg_latency:
+                self.limit = max(float(self.min_limit), self.limit / 2)
+                self._last_decrease = now
+                logger.info(
+                    f"Host latency {self.avg_latency:.2f}s above target, "
+                    f"lowering concurrency to {int(self.limit)}."
+                )
+        else:
+            self.limit = min(float(self.max_limit), self.limit + 1 / self.limit)
+
+    def _wake(self):
+        free = int(self.limit) - self.in_flight
+        while free > 0 and self._waiters:
+            fut = self._waiters.popleft()
+            if not fut.done():
+                fut.set_result(None)
+                free -= 1
+
+
+class CrawlScheduler:
+    """
+    Walks directory trees through a shared work queue. Every request to a host
+    goes through that host's AdaptiveLimiter (see slot()), so listings and HEAD
+    probes from all concurrent crawls share one per-host budget.
+    """
+
+    def __init__(self, max_per_host: int = 8, min_per_host: int = 1, latency_target: float = 2.0, workers: int = 16):
+        self.max_per_host = max_per_host
+        self.min_per_host = min_per_host
+        self.latency_target = latency_target
+        self.workers = max(1, workers)
+        self._limiters: dict[str, AdaptiveLimiter] = {}
+
+    def limiter_for(self, url: str) -> AdaptiveLimiter:
+        host = urlsplit(url).netloc
+        limiter = self._limiters.get(host)
+        if limiter is None:
+            limiter = AdaptiveLimiter(self.max_per_host, self.min_per_host, self.latency_target)
+            self._limiters[host] = limiter
+        return limiter
+
+    @contextlib.asynccontextmanager
+    async def slot(self, url: str):
+        """Holds one of the host's concurrency slots for the duration of a request."""
+        limiter = self.limiter_for(url)
+        await limiter.acquire()
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            limiter.release(time.monotonic() - start)
+
+    async def run(self, seeds: list, visit) -> list:
+        """
+        Crawls from 'seeds'. visit(url) is a coroutine returning a list of
+        (CRAWL_RESULT, value) and (CRAWL_FOLLOW, child_url) entries in listing
+        order. Children are fanned out across the workers, and the values are
+        returned in the same order a serial depth-first walk would produce.
+        A visit that raises is logged and contributes no entries, so callers
+        must not line results up with 'seeds' by position.
+        """
+        queue: asyncio.Queue = asyncio.Queue()
+        results = []
+        seen = set()
+
+        def submit(key: tuple, url: str):
+            if url in seen:
+                return
+            seen.add(url)
+            queue.put_nowait((key, url))
+
+        for i, url in enumerate(seeds):
+            submit((i,), url)
+
+        async def worker():
+            while True:
+                key, url = await queue.get()
+                try:
+                    for i, (kind, value) in enumerate(await visit(url)):
+                        if kind == CRAWL_FOLLOW:
+                            submit(key + (i,), value)
+                        else:
+                            results.append((key + (i,), value))
+                except Exception as e:
+                    logger.error(f"Crawl of {url} failed: {e}", exc_info=True)
+                finally:
+                    queue.task_done()
+
+        tasks = [asyncio.create_task(worker()) for _ in range(self.workers)]
+        try:
+            await queue.join()
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        results.sort(key=lambda r: r[0])
+        return [value for _, value in results]
+
+    def stats(self) -> dict:
+        """Returns the current limit, in-flight count and average latency per host."""
+        return {
+            host: {
+                "limit": int(limiter.limit),
+                "in_flight": limiter.in_flight,
+                "avg_latency": limiter.avg_latency,
+            }
+            for host, limiter in self._limiters.items()
+        }
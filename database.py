@@ -1,11 +1,61 @@
 import os
+import copy
+import asyncio
 import logging
+import functools
+from concurrent.futures import ThreadPoolExecutor
 from supabase import create_client, Client
 import time
+from search_index import InvertedIndex
+from cache import TTLCache
+from counts import CatalogCounts
+from local_db import LocalDatabase, MIRRORED_TABLES
 
 logger = logging.getLogger(__name__)
 
 supabase_client: Client | None = None
+db_executor: ThreadPoolExecutor | None = None
+local_db: LocalDatabase | None = None
+
+# Storage backend:
+#   "supabase" - everything goes to Supabase (default)
+#   "sqlite"   - everything is served by the local SQLite database, no Supabase needed
+#   "replica"  - reads come from a local SQLite mirror of the Supabase tables; writes go
+#                to Supabase and are applied to the mirror once Supabase accepted them
+DB_BACKEND = os.getenv("DB_BACKEND", "supabase").lower()
+LOCAL_DB_PATH = os.getenv("LOCAL_DB_PATH", "movie_bot.sqlite3")
+# How often the replica is fully re-synced, which also repairs any missed mirror writes.
+REPLICA_SYNC_INTERVAL = int(os.getenv("REPLICA_SYNC_INTERVAL", str(30 * 60)))
+REPLICA_SYNC_ATTEMPTS = 3
+replica_mirrored_writes = 0
+
+# The supabase client is synchronous; at most this many queries run at once on
+# worker threads, sharing the client's pooled HTTP connections.
+DB_MAX_WORKERS = int(os.getenv("DB_MAX_WORKERS", "8"))
+
+# In-memory search indexes over normalized_name. Searches are answered locally once
+# they are loaded; Supabase stays the source of truth and is queried until then.
+movie_search_index = InvertedIndex()
+webseries_search_index = InvertedIndex()
+
+# Read-through cache in front of the hot detail, episode and count reads.
+READ_CACHE_SIZE = int(os.getenv("READ_CACHE_SIZE", "2048"))
+READ_CACHE_TTL = int(os.getenv("READ_CACHE_TTL", "600"))
+read_cache = TTLCache(READ_CACHE_SIZE, READ_CACHE_TTL)
+
+# Movie and webseries row counts, overall and per category. Kept current by writes
+# and recomputed in full by recompute_counts() after a refresh.
+catalog_counts = CatalogCounts()
+# "catalog" is the movies+webseries view, counted as one so browse needs a single number.
+COUNTED_TABLES = ("movies", "webseries", "catalog")
+
+# PostgREST caps a single select at 1000 rows by default.
+SELECT_PAGE_SIZE = 1000
+# Larger pages would be truncated by the row cap, so the setting is capped at it.
+USER_PAGE_SIZE = min(int(os.getenv("USER_PAGE_SIZE", str(SELECT_PAGE_SIZE))), SELECT_PAGE_SIZE)
+USER_PAGE_RETRIES = 3
+DELETE_CHUNK_SIZE = 200
+UPSERT_CHUNK_SIZE = 500
 
 
 def get_supabase_client() -> Client:
@@ -26,55 +76,483 @@ def get_supabase_client() -> Client:
     return supabase_client
 
 
+def get_db_executor() -> ThreadPoolExecutor:
+    """Returns the bounded thread pool that runs blocking Supabase calls."""
+    global db_executor
+    if db_executor is None:
+        db_executor = ThreadPoolExecutor(
+            max_workers=DB_MAX_WORKERS, thread_name_prefix="supabase"
+        )
+    return db_executor
+
+
+async def _execute(query):
+    """Runs a query's blocking .execute() on the DB thread pool and awaits the response."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_db_executor(), query.execute)
+
+
+async def _fetch_all_pages(build_query) -> list:
+    """
+    Runs the query built by build_query() page by page until a short page comes back,
+    so results are not silently truncated by PostgREST's row cap.
+    """
+    rows = []
+    offset = 0
+    while True:
+        response = await _execute(build_query().range(offset, offset + SELECT_PAGE_SIZE - 1))
+        rows.extend(response.data)
+        if len(response.data) < SELECT_PAGE_SIZE:
+            return rows
+        offset += SELECT_PAGE_SIZE
+
+
+async def _run_local(method_name: str, *args, **kwargs):
+    """Runs a LocalDatabase method on the DB thread pool."""
+    loop = asyncio.get_running_loop()
+    method = getattr(local_db, method_name)
+    return await loop.run_in_executor(
+        get_db_executor(), functools.partial(method, *args, **kwargs)
+    )
+
+
+def _local_read(fallback=None, replica: bool = True):
+    """
+    Serves the decorated function from the local database in the "sqlite" and
+    "replica" backends. 'fallback' is returned if the local query fails, matching
+    what the Supabase implementation returns on errors. With replica=False the
+    "replica" backend reads Supabase, for tables the replica does not mirror.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            if DB_BACKEND == "supabase" or (DB_BACKEND == "replica" and not replica):
+                return await func(*args, **kwargs)
+            try:
+                return await _run_local(func.__name__, *args, **kwargs)
+            except Exception as e:
+                logger.error(f"Error in local {func.__name__}: {e}", exc_info=True)
+                return copy.copy(fallback)
+        return wrapper
+    return decorator
+
+
+def _local_write(fallback=False, mirror_result_as: str | None = None, mirror: bool = True):
+    """
+    Routes the decorated write to the local database in the "sqlite" backend. In the
+    "replica" backend it runs against Supabase first and is mirrored locally only if
+    Supabase accepted it (a truthy result, or for per-entry results at least one
+    stored entry). 'mirror_result_as' passes that result to the local method as a
+    keyword, e.g. the ids Supabase assigned to new rows or which entries it stored.
+    With mirror=False the "replica" backend only writes Supabase.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            global replica_mirrored_writes
+            if DB_BACKEND == "sqlite":
+                try:
+                    return await _run_local(func.__name__, *args, **kwargs)
+                except Exception as e:
+                    logger.error(f"Error in local {func.__name__}: {e}", exc_info=True)
+                    return fallback
+
+            result = await func(*args, **kwargs)
+            accepted = any(result) if isinstance(result, list) else bool(result)
+            if DB_BACKEND == "replica" and mirror and accepted:
+                mirror_kwargs = dict(kwargs)
+                if mirror_result_as:
+                    mirror_kwargs[mirror_result_as] = result
+                try:
+                    await _run_local(func.__name__, *args, **mirror_kwargs)
+                    replica_mirrored_writes += 1
+                except Exception as e:
+                    # The next replica sync picks the row up from Supabase.
+                    logger.error(f"Error mirroring {func.__name__} locally: {e}", exc_info=True)
+            return result
+        return wrapper
+    return decorator
+
+
+def _read_through(func):
+    """
+    Serves the decorated read from read_cache, keyed by function name and arguments.
+    Empty results (None, 0, []) are not cached because they are also what the
+    functions return on errors.
+    """
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        key = (func.__name__, *args, *sorted(kwargs.items()))
+        value = read_cache.get(key, None)
+        if value is not None:
+            return value
+        version = read_cache.version
+        value = await func(*args, **kwargs)
+        if value:
+            read_cache.set(key, value, version)
+        return value
+    return wrapper
+
+
+def _invalidates(invalidate):
+    """
+    Calls invalidate(result, *args, **kwargs) with the decorated write's result
+    (None if it raised) and arguments once the write finishes.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            result = None
+            try:
+                result = await func(*args, **kwargs)
+                return result
+            finally:
+                invalidate(result, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _invalidate_movies(names):
+    for name in names:
+        read_cache.invalidate(("get_movie_details", name))
+    read_cache.invalidate_prefix("browse_category_page")
+    # Upserts don't tell inserts from updates, so the movie counts are re-queried
+    # on demand; a refresh recomputes them all at the end.
+    catalog_counts.invalidate("movies")
+    catalog_counts.invalidate("catalog")
+
+
+def _invalidate_movie_batch(result, movie_items):
+    _invalidate_movies(item["original_name"] for item in movie_items)
+
+
+def _invalidate_single_movie(result, name, *args, **kwargs):
+    _invalidate_movies([name])
+
+
+def _invalidate_deleted_movies(result, names):
+    _invalidate_movies(names)
+
+
+def _invalidate_all_movies(result):
+    read_cache.invalidate_prefix("get_movie_details")
+    read_cache.invalidate_prefix("browse_category_page")
+    catalog_counts.invalidate("movies")
+    catalog_counts.invalidate("catalog")
+
+
+def _invalidate_webseries(result, name, category, *args, **kwargs):
+    read_cache.invalidate(("get_webseries_details", name))
+    read_cache.invalidate_prefix("browse_category_page")
+    if result is not None:
+        catalog_counts.adjust("webseries", category, 1)
+        catalog_counts.adjust("catalog", category, 1)
+
+
+def _invalidate_episodes(result, series_id, *args, **kwargs):
+    read_cache.invalidate(("get_episodes_for_series", series_id))
+
+
 async def initialize_db():
     """Initializes and tests the database connection. Raises an exception on failure."""
+    global local_db
+    if DB_BACKEND not in ("supabase", "sqlite", "replica"):
+        raise ValueError(f"Unknown DB_BACKEND '{DB_BACKEND}'.")
+
+    if DB_BACKEND in ("sqlite", "replica") and local_db is None:
+        local_db = LocalDatabase(LOCAL_DB_PATH)
+    if DB_BACKEND == "sqlite":
+        logger.info(f"Using the local SQLite database at {LOCAL_DB_PATH}.")
+        return
+
     logger.info("Initializing Supabase database connection...")
     try:
         client = get_supabase_client()
-        # --- FIX: Removed 'await' as the user's library version uses a synchronous .execute() method ---
-        client.table("movies").select("id", count="exact").limit(1).execute()
+        # The client's .execute() is synchronous, so it runs on the DB thread pool.
+        await _execute(client.table("movies").select("id", count="exact").limit(1))
         logger.info("Successfully connected to Supabase.")
     except Exception as e:
         logger.error(f"Failed to connect to Supabase: {e}", exc_info=True)
         raise e
 
+    if DB_BACKEND == "replica":
+        if not await sync_local_replica():
+            raise RuntimeError("Initial sync of the local replica failed.")
+
+
+async def sync_local_replica(only: list[str] | None = None) -> bool:
+    """
+    Copies the mirrored Supabase tables (or just those in 'only') into the local
+    replica in one transaction. If writes were mirrored while the tables were being
+    fetched, the snapshot may predate them, so it is fetched again (up to
+    REPLICA_SYNC_ATTEMPTS times). The users and requests tables only grow and are
+    not mirrored; the replica reads them from Supabase.
+    """
+    client = get_supabase_client()
+    try:
+        for _ in range(REPLICA_SYNC_ATTEMPTS):
+            writes_before = replica_mirrored_writes
+            tables = {}
+            for table, columns in MIRRORED_TABLES.items():
+                if only is not None and table not in only:
+                    continue
+                tables[table] = await _fetch_all_pages(
+                    lambda: client.table(table).select(", ".join(columns)).order(columns[0])
+                )
+            if replica_mirrored_writes == writes_before:
+                break
+        await _run_local("replace_all", tables)
+        read_cache.clear()
+        for table in COUNTED_TABLES:
+            catalog_counts.invalidate(table)
+        return True
+    except Exception as e:
+        logger.error(f"Error syncing the local replica from Supabase: {e}", exc_info=True)
+    return False
+
+
+async def run_replica_sync():
+    """Re-syncs the local replica every REPLICA_SYNC_INTERVAL seconds."""
+    while True:
+        await asyncio.sleep(REPLICA_SYNC_INTERVAL)
+        await sync_local_replica()
+
+
+async def load_search_index():
+    """(Re)builds the in-memory search indexes from one scan of the catalog view."""
+    global movie_search_index, webseries_search_index
+    if DB_BACKEND != "supabase":
+        # Searches are answered by the local database's FTS5 indexes.
+        return
+    client = get_supabase_client()
+    try:
+        rows = await _fetch_all_pages(
+            lambda: client.table("catalog")
+            .select("id, name, type, normalized_name, category")
+            .order("type_order")
+            .order("id")
+        )
+        fresh_indexes = {"movie": InvertedIndex(), "webseries": InvertedIndex()}
+        for row in rows:
+            fresh_indexes[row["type"]].add(
+                row["name"], row["normalized_name"] or "", row.get("category"), row["id"]
+            )
+        for index in fresh_indexes.values():
+            index.loaded = True
+        # Swap both at once so searches never see a half-built index.
+        movie_search_index, webseries_search_index = fresh_indexes["movie"], fresh_indexes["webseries"]
+        logger.info(
+            f"Search index loaded: {len(movie_search_index)} movies, "
+            f"{len(webseries_search_index)} webseries."
+        )
+    except Exception as e:
+        logger.error(f"Error loading search index from Supabase: {e}", exc_info=True)
+
+
+async def close_db():
+    """Waits for in-flight queries and shuts down the DB thread pool."""
+    global db_executor, local_db
+    if db_executor is not None:
+        db_executor.shutdown(wait=True)
+        db_executor = None
+        logger.info("Database thread pool shut down.")
+    if local_db is not None:
+        local_db.close()
+        local_db = None
+
+# --- Count Functions ---
+@_local_read()
+async def count_rows(table: str, category: str | None = None, estimated: bool = False) -> int | None:
+    """
+    Counts the rows of 'table', optionally within one category. Only the count is
+    requested, no row data. Returns None on failure.
+    """
+    client = get_supabase_client()
+    try:
+        query = client.table(table).select("id", count="estimated" if estimated else "exact")
+        if category is not None:
+            query = query.eq("category", category)
+        response = await _execute(query.limit(1))
+        return response.count
+    except Exception as e:
+        logger.error(f"Error counting {table} in Supabase: {e}", exc_info=True)
+    return None
+
+
+@_local_read()
+async def count_catalog_by_category() -> dict | None:
+    """
+    Returns {"movies": {category: rows}, "webseries": {category: rows}} from the
+    grouped catalog_category_counts view (one row per type and category), or None
+    on failure.
+    """
+    client = get_supabase_client()
+    try:
+        response = await _execute(
+            client.table("catalog_category_counts").select("type, category, row_count")
+        )
+        category_counts = {"movies": {}, "webseries": {}}
+        for row in response.data:
+            counts = category_counts["movies" if row["type"] == "movie" else "webseries"]
+            counts[row["category"]] = counts.get(row["category"], 0) + row["row_count"]
+        return category_counts
+    except Exception as e:
+        logger.error(f"Error counting the catalog by category in Supabase: {e}", exc_info=True)
+    return None
+
+
+async def recompute_counts():
+    """Recounts movies and webseries per category and replaces the in-memory counts."""
+    version = catalog_counts.version
+    category_counts = await count_catalog_by_category()
+    if category_counts is None:
+        return
+    combined = {}
+    for counts in category_counts.values():
+        for category, count in counts.items():
+            combined[category] = combined.get(category, 0) + count
+    category_counts["catalog"] = combined
+    for table in COUNTED_TABLES:
+        catalog_counts.replace(table, category_counts[table], version)
+    logger.info(
+        "Catalog counts recomputed: "
+        + ", ".join(f"{catalog_counts.total(table)} {table}" for table in ("movies", "webseries"))
+    )
+
+
+async def _count(table: str, category: str | None = None, estimated: bool = False) -> int:
+    """Serves a count from catalog_counts, querying and remembering it on a miss."""
+    if category is None:
+        cached = catalog_counts.total(table)
+    else:
+        cached = catalog_counts.category(table, category)
+    if cached is not None:
+        return cached
+
+    version = catalog_counts.version
+    count = await count_rows(table, category, estimated)
+    if count is None:
+        return 0
+    # Estimates are never stored, so an exact count is always what is remembered.
+    if not estimated:
+        if category is None:
+            catalog_counts.set_total(table, count, version)
+        else:
+            catalog_counts.set_category(table, category, count, version)
+    return count
+
+
 # --- User Functions ---
+@_local_write(mirror=False)
 async def add_user(user_id: int):
     """Adds or updates a user in the database for broadcast purposes."""
     client = get_supabase_client()
     try:
-        client.table("users").upsert({"user_id": user_id}, on_conflict="user_id").execute()
+        await _execute(client.table("users").upsert({"user_id": user_id}, on_conflict="user_id"))
         logger.info(f"Upserted user_id: {user_id}")
+        return True
     except Exception as e:
         logger.error(f"Error upserting user {user_id}: {e}", exc_info=True)
+    return False
 
 
-async def get_all_user_ids() -> list[int]:
-    """Retrieves a list of all unique user IDs from the database."""
+@_local_write(mirror=False)
+async def add_users(user_ids: list[int]) -> bool:
+    """Upserts a batch of users in one request. Returns False if the write failed."""
+    if not user_ids:
+        return True
+
+    client = get_supabase_client()
+    try:
+        await _execute(
+            client.table("users").upsert(
+                [{"user_id": user_id} for user_id in user_ids], on_conflict="user_id"
+            )
+        )
+        logger.info(f"Upserted {len(user_ids)} users.")
+        return True
+    except Exception as e:
+        logger.error(f"Error upserting {len(user_ids)} users: {e}", exc_info=True)
+    return False
+
+
+@_local_read(replica=False)
+async def get_user_id_page(after_user_id: int | None, limit: int) -> list[int] | None:
+    """
+    Returns up to 'limit' user ids greater than 'after_user_id' in ascending order
+    (keyset pagination). Returns None on failure.
+    """
     client = get_supabase_client()
     try:
-        response = client.table("users").select("user_id").execute()
-        return [item['user_id'] for item in response.data]
+        query = client.table("users").select("user_id").order("user_id").limit(limit)
+        if after_user_id is not None:
+            query = query.gt("user_id", after_user_id)
+        response = await _execute(query)
+        return [item["user_id"] for item in response.data]
     except Exception as e:
-        logger.error(f"Error getting all user IDs: {e}", exc_info=True)
+        logger.error(f"Error getting a page of user IDs: {e}", exc_info=True)
+    return None
+
+
+async def iter_user_ids(page_size: int = USER_PAGE_SIZE):
+    """
+    Yields every user id in ascending order, fetching one keyset page at a time so
+    memory stays flat. A page that keeps failing raises RuntimeError instead of
+    ending the iteration early, so callers never mistake an error for the end.
+    Only an empty page ends it, since the server may return fewer rows than asked.
+    """
+    after_user_id = None
+    while True:
+        for attempt in range(USER_PAGE_RETRIES):
+            page = await get_user_id_page(after_user_id, page_size)
+            if page is not None:
+                break
+            await asyncio.sleep(2 ** attempt)
+        else:
+            raise RuntimeError(f"Could not fetch user ids after {after_user_id}.")
+
+        if not page:
+            return
+        for user_id in page:
+            yield user_id
+        after_user_id = page[-1]
+
+
+async def get_all_user_ids() -> list[int]:
+    """Retrieves a list of all unique user IDs from the database."""
+    try:
+        return [user_id async for user_id in iter_user_ids()]
+    except RuntimeError as e:
+        logger.error(f"Error getting all user IDs: {e}")
         return []
 
 
 # --- Movie Functions ---
+@_invalidates(_invalidate_all_movies)
+@_local_write()
 async def clear_scraped_movies():
     """Deletes all records from the movies table that were added by scraping."""
     client = get_supabase_client()
     try:
-        response = client.table("movies").delete().eq("source", "scraped").execute()
+        response = await _execute(client.table("movies").delete().eq("source", "scraped"))
+        for row in response.data:
+            movie_search_index.remove(row["name"])
         logger.info(f"Cleared {len(response.data)} scraped movies from Supabase.")
+        return True
     except Exception as e:
         logger.error(f"Error clearing scraped movies from Supabase: {e}", exc_info=True)
+    return False
 
 
-async def add_movie_batch(movie_items: list):
-    """Adds a batch of movie items to the database."""
+@_invalidates(_invalidate_movie_batch)
+@_local_write(fallback=None, mirror_result_as="ids")
+async def add_movie_batch(movie_items: list) -> dict[str, int] | None:
+    """
+    Adds a batch of movie items to the database. Returns {name: id} for the stored
+    rows, or None if the write failed.
+    """
     if not movie_items:
-        return
+        return {}
 
     client = get_supabase_client()
     timestamp = int(time.time())
@@ -91,60 +569,167 @@ async def add_movie_batch(movie_items: list):
         for item in movie_items
     ]
     try:
-        response = (
+        response = await _execute(
             client.table("movies")
             .upsert(records_to_insert, on_conflict="name")
-            .execute()
         )
+        for row in response.data:
+            movie_search_index.add(
+                row["name"], row["normalized_name"], row["category"], row["id"]
+            )
         logger.info(
             f"Successfully added/updated {len(response.data)} movies in Supabase."
         )
+        return {row["name"]: row["id"] for row in response.data}
     except Exception as e:
         logger.error(f"Error adding movie batch to Supabase: {e}", exc_info=True)
+    return None
 
 
-async def search_movies_by_normalized_name(normalized_query: str, limit: int = 15):
+@_local_read()
+async def get_scraped_movies_snapshot() -> dict | None:
     """
-    Searches for movies where the normalized_name contains all words from the query,
-    matching them as whole words for better accuracy.
+    Returns {name: {"url", "type", "category"}} for every scraped movie.
+    Pages through the table so the result is not truncated by PostgREST's row cap.
+    Returns None on failure so callers can tell an error apart from an empty table.
+    """
+    client = get_supabase_client()
+    try:
+        rows = await _fetch_all_pages(
+            lambda: client.table("movies")
+            .select("name, url, type, category")
+            .eq("source", "scraped")
+            .order("name")
+        )
+        return {
+            row["name"]: {"url": row["url"], "type": row["type"], "category": row["category"]}
+            for row in rows
+        }
+    except Exception as e:
+        logger.error(f"Error reading scraped movies from Supabase: {e}", exc_info=True)
+    return None
+
+
+@_invalidates(_invalidate_deleted_movies)
+@_local_write()
+async def delete_movies_by_names(names: list[str]) -> bool:
+    """
+    Deletes scraped movies by name, in chunks to keep the filter URL short.
+    Returns False if any chunk failed.
+    """
+    if not names:
+        return True
+
+    client = get_supabase_client()
+    deleted = 0
+    ok = True
+    for start in range(0, len(names), DELETE_CHUNK_SIZE):
+        chunk = names[start : start + DELETE_CHUNK_SIZE]
+        try:
+            response = await _execute(
+                client.table("movies")
+                .delete()
+                .eq("source", "scraped")
+                .in_("name", chunk)
+            )
+            deleted += len(response.data)
+            for row in response.data:
+                movie_search_index.remove(row["name"])
+        except Exception as e:
+            logger.error(f"Error deleting movies from Supabase: {e}", exc_info=True)
+            ok = False
+    logger.info(f"Deleted {deleted} vanished movies from Supabase.")
+    return ok
+
+
+async def _search_by_normalized_name(table: str, normalized_query: str, limit: int) -> list:
     """
+    Returns id, name and category of rows in 'table' ("movies" or "webseries")
+    whose normalized_name contains all words from the query, matching them as whole
+    words for better accuracy. Tables are served from the in-memory index once it is loaded.
+    """
+    index = movie_search_index if table == "movies" else webseries_search_index
+    if index.loaded:
+        return index.search(normalized_query, limit)
+
     client = get_supabase_client()
     query_words = normalized_query.split()
 
     if not query_words:
         return []
 
-    try:
-        query = client.table("movies").select("name, normalized_name")
-
-        # For each word in the search query, build a filter that matches it as a whole word.
-        # This is more precise than a simple 'contains' check.
-        for word in query_words:
-            or_filter = (
-                f"normalized_name.eq.{word},"  # Exact match
-                f"normalized_name.ilike.{word} %,"  # Starts with word
-                f"normalized_name.ilike.% {word},"  # Ends with word
-                f"normalized_name.ilike.% {word} %"  # Contains word with spaces
-            )
-            query = query.or_(or_filter)
+    query = client.table(table).select("id, name, category")
+
+    # For each word in the search query, build a filter that matches it as a whole word.
+    # This is more precise than a simple 'contains' check.
+    for word in query_words:
+        or_filter = (
+            f"normalized_name.eq.{word},"  # Exact match
+            f"normalized_name.ilike.{word} %,"  # Starts with word
+            f"normalized_name.ilike.% {word},"  # Ends with word
+            f"normalized_name.ilike.% {word} %"  # Contains word with spaces
+        )
+        query = query.or_(or_filter)
+
+    response = await _execute(query.limit(limit))
+    return response.data
 
-        response = query.limit(limit).execute()
-        return [row["name"] for row in response.data]
+
+@_local_read(fallback=[])
+async def search_movies_by_normalized_name(normalized_query: str, limit: int = 15):
+    """
+    Searches for movies where the normalized_name contains all words from the query,
+    matching them as whole words for better accuracy.
+    """
+    try:
+        rows = await _search_by_normalized_name("movies", normalized_query, limit)
+        return [row["name"] for row in rows]
     except Exception as e:
         logger.error(f"Error searching movies in Supabase: {e}", exc_info=True)
         return []
 
 
+@_local_read(fallback=[])
+async def search_catalog_by_normalized_name(normalized_query: str, limit: int = 15):
+    """
+    Searches movies and webseries and returns [{"id", "name", "type", "category"}] so
+    callers need no per-result detail lookups. Movies come first and win name clashes,
+    the same precedence get_movie_details/get_webseries_details lookups have. Each
+    kind gets its own 'limit', so a flood of movie matches never hides a webseries.
+    Tables whose in-memory index is not loaded yet are queried concurrently.
+    """
+    try:
+        movies, webseries = await asyncio.gather(
+            _search_by_normalized_name("movies", normalized_query, limit),
+            _search_by_normalized_name("webseries", normalized_query, limit),
+        )
+    except Exception as e:
+        logger.error(f"Error searching the catalog in Supabase: {e}", exc_info=True)
+        return []
+    rows = [dict(row, type="movie") for row in movies] + [dict(row, type="webseries") for row in webseries]
+
+    results = []
+    seen = set()
+    for row in rows:
+        if row["name"] not in seen:
+            seen.add(row["name"])
+            results.append(
+                {"id": row["id"], "name": row["name"], "type": row["type"], "category": row.get("category")}
+            )
+    return results
+
+
+@_read_through
+@_local_read()
 async def get_movie_details(name: str):
     """Retrieves all details for a specific movie by its exact name."""
     client = get_supabase_client()
     try:
-        response = (
+        response = await _execute(
             client.table("movies")
             .select("name, url, type, category, source")
             .eq("name", name)
             .limit(1)
-            .execute()
         )
         if response.data:
             row = response.data[0]
@@ -160,27 +745,25 @@ async def get_movie_details(name: str):
     return None
 
 
-async def get_movie_count():
-    """Returns the total number of movies in the database."""
-    client = get_supabase_client()
-    try:
-        response = client.table("movies").select("id", count="exact").execute()
-        return response.count
-    except Exception as e:
-        logger.error(f"Error getting movie count from Supabase: {e}", exc_info=True)
-    return 0
+async def get_movie_count(estimated: bool = False):
+    """
+    Returns the total number of movies in the database. With estimated=True a
+    count that is not held in memory comes from the planner's estimate instead of
+    an exact count, which is all /stats needs.
+    """
+    return await _count("movies", estimated=estimated)
 
 
+@_local_read()
 async def get_movie_by_normalized_name(normalized_name: str):
     """Retrieves a movie by its normalized name."""
     client = get_supabase_client()
     try:
-        response = (
+        response = await _execute(
             client.table("movies")
             .select("name, url, type, category, source")
             .eq("normalized_name", normalized_name)
             .limit(1)
-            .execute()
         )
         if response.data:
             return response.data[0]
@@ -191,6 +774,8 @@ async def get_movie_by_normalized_name(normalized_name: str):
     return None
 
 
+@_invalidates(_invalidate_single_movie)
+@_local_write(fallback=None, mirror_result_as="movie_id")
 async def add_single_movie(
     name: str,
     url: str,
@@ -198,101 +783,182 @@ async def add_single_movie(
     normalized_name: str,
     category: str,
     source: str = "manual",
-):
-    """Adds or updates a single movie in the database."""
+) -> int | None:
+    """Adds or updates a single movie in the database. Returns its id, or None on failure."""
     client = get_supabase_client()
     timestamp = int(time.time())
     try:
-        client.table("movies").upsert(
-            {
-                "name": name,
-                "url": url,
-                "type": item_type,
-                "normalized_name": normalized_name,
-                "category": category,
-                "source": source,
-                "last_updated": timestamp,
-            },
-            on_conflict="name",
-        ).execute()
+        response = await _execute(
+            client.table("movies").upsert(
+                {
+                    "name": name,
+                    "url": url,
+                    "type": item_type,
+                    "normalized_name": normalized_name,
+                    "category": category,
+                    "source": source,
+                    "last_updated": timestamp,
+                },
+                on_conflict="name",
+            )
+        )
+        movie_search_index.add(name, normalized_name, category, response.data[0]["id"])
         logger.info(f"Successfully added/updated '{name}' in Supabase.")
+        return response.data[0]["id"]
     except Exception as e:
         logger.error(f"Error adding single movie to Supabase: {e}", exc_info=True)
+    return None
 
 
-# --- Request Functions ---
-async def add_request(user_id: int, movie_title: str):
+# --- File Index Functions ---
+@_local_read(fallback=[])
+async def get_files_for_movie(movie_name: str) -> list:
+    """
+    Returns the indexed files of a directory item in listing order, as dicts with
+    url, display_name, size, modified and last_seen. Returns [] if it was never indexed.
+    """
     client = get_supabase_client()
-    timestamp = int(time.time())
     try:
-        client.table("requests").insert(
-            {"user_id": user_id, "movie_title": movie_title, "timestamp": timestamp}
-        ).execute()
-        logger.info(f"User {user_id} requested '{movie_title}' in Supabase.")
+        return await _fetch_all_pages(
+            lambda: client.table("files")
+            .select("url, display_name, size, modified, last_seen")
+            .eq("movie_name", movie_name)
+            .order("position")
+        )
     except Exception as e:
-        logger.error(f"Error adding request to Supabase: {e}", exc_info=True)
+        logger.error(f"Error getting indexed files from Supabase: {e}", exc_info=True)
+    return []
 
 
-async def get_requests():
+@_local_write()
+async def replace_files_for_movie(movie_name: str, files: list) -> bool:
+    """
+    Stores the recursive file listing of a directory item, given as
+    (url, display_name, size, modified) tuples, and drops files that are gone.
+    """
     client = get_supabase_client()
+    timestamp = int(time.time())
+    records = [
+        {
+            "movie_name": movie_name,
+            "position": position,
+            "url": url,
+            "display_name": display_name,
+            "size": size,
+            "modified": modified,
+            "last_seen": timestamp,
+        }
+        for position, (url, display_name, size, modified) in enumerate(files)
+    ]
     try:
-        response = client.table("requests").select("movie_title").execute()
+        for start in range(0, len(records), UPSERT_CHUNK_SIZE):
+            await _execute(
+                client.table("files").upsert(
+                    records[start : start + UPSERT_CHUNK_SIZE], on_conflict="movie_name,url"
+                )
+            )
+        await _execute(
+            client.table("files").delete().eq("movie_name", movie_name).lt("last_seen", timestamp)
+        )
+        logger.info(f"Indexed {len(records)} files for '{movie_name}' in Supabase.")
+        return True
+    except Exception as e:
+        logger.error(f"Error indexing files for '{movie_name}' in Supabase: {e}", exc_info=True)
+    return False
 
-        request_counts = {}
-        for row in response.data:
-            title = row["movie_title"]
-            request_counts[title] = request_counts.get(title, 0) + 1
 
-        return sorted(request_counts.items(), key=lambda item: item[1], reverse=True)
+# --- Request Functions ---
+@_local_write()
+async def add_request(user_id: int, movie_title: str, normalized_title: str):
+    """
+    Logs a request and bumps the per-title total in request_counts. Both happen in
+    one server-side call (log_request in schema.sql), so the log and the totals
+    cannot drift apart and concurrent requests for the same title are not lost.
+    """
+    client = get_supabase_client()
+    try:
+        await _execute(
+            client.rpc(
+                "log_request",
+                {
+                    "p_user_id": user_id,
+                    "p_title": movie_title,
+                    "p_normalized_title": normalized_title,
+                    "p_timestamp": int(time.time()),
+                },
+            )
+        )
+        logger.info(f"User {user_id} requested '{movie_title}' in Supabase.")
+        return True
     except Exception as e:
-        logger.error(f"Error getting requests from Supabase: {e}", exc_info=True)
-    return []
+        logger.error(f"Error adding request to Supabase: {e}", exc_info=True)
+    return False
 
 
-async def get_movies_by_category(category: str, offset: int = 0, limit: int = 10):
+@_local_read(fallback=[])
+async def get_requests(limit: int = 10):
+    """Returns the 'limit' most requested titles as (title, count), most requested first."""
     client = get_supabase_client()
     try:
-        response = (
-            client.table("movies")
-            .select("name")
-            .eq("category", category)
-            .order("name")
-            .range(offset, offset + limit - 1)
-            .execute()
+        response = await _execute(
+            client.table("request_counts")
+            .select("title, request_count")
+            .order("request_count", desc=True)
+            .limit(limit)
         )
-        return [row["name"] for row in response.data]
+        return [(row["title"], row["request_count"]) for row in response.data]
     except Exception as e:
-        logger.error(
-            f"Error getting movies by category from Supabase: {e}", exc_info=True
-        )
+        logger.error(f"Error getting requests from Supabase: {e}", exc_info=True)
     return []
 
 
-async def count_movies_in_category(category: str):
+@_local_write(mirror=False)
+async def rebuild_request_counts(normalize) -> bool:
+    """
+    Recomputes request_counts from the full requests log, grouping titles with
+    'normalize'. Only needed once for requests logged before request_counts existed.
+    The replica does not mirror the log, so it re-syncs request_counts afterwards.
+    """
     client = get_supabase_client()
     try:
-        response = (
-            client.table("movies")
-            .select("id", count="exact")
-            .eq("category", category)
-            .execute()
+        rows = await _fetch_all_pages(
+            lambda: client.table("requests").select("movie_title, timestamp").order("id")
         )
-        return response.count
+        aggregates = {}
+        for row in rows:
+            key = normalize(row["movie_title"])
+            entry = aggregates.setdefault(
+                key, {"normalized_title": key, "request_count": 0, "last_requested": None}
+            )
+            entry["title"] = row["movie_title"]
+            entry["request_count"] += 1
+            entry["last_requested"] = row["timestamp"]
+        records = list(aggregates.values())
+        for start in range(0, len(records), UPSERT_CHUNK_SIZE):
+            await _execute(
+                client.table("request_counts").upsert(
+                    records[start : start + UPSERT_CHUNK_SIZE], on_conflict="normalized_title"
+                )
+            )
+        logger.info(f"Rebuilt request counts for {len(records)} titles in Supabase.")
+        if DB_BACKEND == "replica":
+            await sync_local_replica(["request_counts"])
+        return True
     except Exception as e:
-        logger.error(
-            f"Error counting movies in category from Supabase: {e}", exc_info=True
-        )
-    return 0
+        logger.error(f"Error rebuilding request counts in Supabase: {e}", exc_info=True)
+    return False
 
 
 # --- Webseries Functions ---
+@_invalidates(_invalidate_webseries)
+@_local_write(fallback=None, mirror_result_as="series_id")
 async def add_webseries(
     name: str, category: str, poster_url: str, plot: str, normalized_name: str
 ) -> int | None:
     client = get_supabase_client()
     timestamp = int(time.time())
     try:
-        response = (
+        response = await _execute(
             client.table("webseries")
             .insert(
                 {
@@ -304,8 +970,8 @@ async def add_webseries(
                     "last_updated": timestamp,
                 }
             )
-            .execute()
         )
+        webseries_search_index.add(name, normalized_name, category, response.data[0]["id"])
         logger.info(f"Successfully added webseries '{name}' to Supabase.")
         return response.data[0]["id"]
     except Exception as e:
@@ -313,6 +979,8 @@ async def add_webseries(
     return None
 
 
+@_invalidates(_invalidate_episodes)
+@_local_write()
 async def add_episode(
     series_id: int,
     season_number: int,
@@ -322,32 +990,109 @@ async def add_episode(
 ):
     client = get_supabase_client()
     try:
-        client.table("episodes").upsert(
-            {
-                "series_id": series_id,
-                "season_number": season_number,
-                "episode_number": episode_number,
-                "url": url,
-                "episode_name": episode_name,
-            },
-            on_conflict="series_id,season_number,episode_number",
-        ).execute()
+        await _execute(
+            client.table("episodes").upsert(
+                {
+                    "series_id": series_id,
+                    "season_number": season_number,
+                    "episode_number": episode_number,
+                    "url": url,
+                    "episode_name": episode_name,
+                },
+                on_conflict="series_id,season_number,episode_number",
+            )
+        )
         logger.info(
             f"Added episode S{season_number}E{episode_number} for series ID {series_id} to Supabase."
         )
+        return True
     except Exception as e:
         logger.error(f"Error adding episode to Supabase: {e}", exc_info=True)
+    return False
+
+
+def _episode_error(episode: dict) -> str | None:
+    """Returns why an episode entry can't be stored, or None if it is valid."""
+    season, number, url = episode.get("season"), episode.get("episode"), episode.get("url")
+    if not isinstance(season, int) or not isinstance(number, int) or season < 0 or number < 0:
+        return "invalid season or episode number"
+    if not isinstance(url, str) or not url.startswith(("http://", "https://")):
+        return "invalid URL"
+    return None
+
+
+async def add_episodes(series_id: int, episodes: list[dict]) -> list[str | None]:
+    """
+    Validates and stores many episodes, given as {"season", "episode", "url", "name"}
+    dicts, in chunked upserts. Returns one result per entry, in order: None if it was
+    stored, otherwise the reason it was not. When the same episode appears more than
+    once the last entry wins.
+    """
+    results: list[str | None] = [None] * len(episodes)
+    latest = {}
+    for i, episode in enumerate(episodes):
+        error = _episode_error(episode)
+        if error:
+            results[i] = error
+            continue
+        key = (episode["season"], episode["episode"])
+        if key in latest:
+            results[latest[key]] = f"replaced by a later S{key[0]}E{key[1]} entry"
+        latest[key] = i
+
+    indices = sorted(latest.values())
+    stored = await upsert_episodes(series_id, [episodes[i] for i in indices])
+    for position, i in enumerate(indices):
+        if not stored or not stored[position]:
+            results[i] = "could not be stored"
+    return results
 
 
+@_invalidates(_invalidate_episodes)
+@_local_write(fallback=None, mirror_result_as="stored")
+async def upsert_episodes(series_id: int, episodes: list[dict]) -> list[bool]:
+    """
+    Upserts validated, duplicate-free episodes in chunks. Returns whether each one
+    was stored; a failed chunk only fails its own entries.
+    """
+    client = get_supabase_client()
+    stored = []
+    for start in range(0, len(episodes), UPSERT_CHUNK_SIZE):
+        chunk = episodes[start : start + UPSERT_CHUNK_SIZE]
+        try:
+            await _execute(
+                client.table("episodes").upsert(
+                    [
+                        {
+                            "series_id": series_id,
+                            "season_number": episode["season"],
+                            "episode_number": episode["episode"],
+                            "url": episode["url"],
+                            "episode_name": episode.get("name"),
+                        }
+                        for episode in chunk
+                    ],
+                    on_conflict="series_id,season_number,episode_number",
+                )
+            )
+            stored.extend([True] * len(chunk))
+        except Exception as e:
+            logger.error(f"Error adding episodes to Supabase: {e}", exc_info=True)
+            stored.extend([False] * len(chunk))
+    logger.info(f"Added {sum(stored)} of {len(episodes)} episodes for series ID {series_id} to Supabase.")
+    return stored
+
+
+@_read_through
+@_local_read()
 async def get_webseries_details(name: str):
     client = get_supabase_client()
     try:
-        response = (
+        response = await _execute(
             client.table("webseries")
             .select("id, name, category, poster_url, plot")
             .eq("name", name)
             .limit(1)
-            .execute()
         )
         if response.data:
             return response.data[0]
@@ -358,16 +1103,17 @@ async def get_webseries_details(name: str):
     return None
 
 
+@_read_through
+@_local_read(fallback=[])
 async def get_episodes_for_series(series_id: int):
     client = get_supabase_client()
     try:
-        response = (
+        response = await _execute(
             client.table("episodes")
             .select("season_number, episode_number, url, episode_name")
             .eq("series_id", series_id)
             .order("season_number")
             .order("episode_number")
-            .execute()
         )
         return [
             {
@@ -385,78 +1131,113 @@ async def get_episodes_for_series(series_id: int):
     return []
 
 
+@_local_read(fallback=[])
 async def search_webseries_by_normalized_name(normalized_query: str, limit: int = 15):
     """
     Searches for webseries where the normalized_name contains all words from the query,
     matching them as whole words for better accuracy.
     """
-    client = get_supabase_client()
-    query_words = normalized_query.split()
-
-    if not query_words:
-        return []
-
     try:
-        query = client.table("webseries").select("name, normalized_name")
-        
-        # For each word in the search query, build a filter that matches it as a whole word.
-        for word in query_words:
-            or_filter = (
-                f"normalized_name.eq.{word},"  # Exact match
-                f"normalized_name.ilike.{word} %,"  # Starts with word
-                f"normalized_name.ilike.% {word},"  # Ends with word
-                f"normalized_name.ilike.% {word} %"  # Contains word with spaces
-            )
-            query = query.or_(or_filter)
-
-        response = query.limit(limit).execute()
-        return [row["name"] for row in response.data]
+        rows = await _search_by_normalized_name("webseries", normalized_query, limit)
+        return [row["name"] for row in rows]
     except Exception as e:
         logger.error(f"Error searching webseries in Supabase: {e}", exc_info=True)
         return []
 
 
-async def get_webseries_by_category(category: str, offset: int = 0, limit: int = 10):
-    client = get_supabase_client()
-    try:
-        response = (
-            client.table("webseries")
-            .select("name")
-            .eq("category", category)
-            .order("name")
-            .range(offset, offset + limit - 1)
-            .execute()
-        )
-        return [row["name"] for row in response.data]
-    except Exception as e:
-        logger.error(
-            f"Error getting webseries by category from Supabase: {e}", exc_info=True
-        )
-    return []
+async def count_webseries(estimated: bool = False):
+    return await _count("webseries", estimated=estimated)
+
+
+async def count_catalog_in_category(category: str):
+    """Returns the number of movies and webseries in a category together."""
+    return await _count("catalog", category)
+
+
+# --- Browse Functions ---
+# A category is browsed as one list of movies and webseries (the catalog view in
+# schema.sql) ordered by (name, type),
+# paged by keyset: a page starts after (or, going back, ends before) the item that
+# ended (or started) the page on screen.
+BROWSE_TYPE_ORDER = {"movie": 0, "webseries": 1}
 
 
-async def count_webseries_in_category(category: str):
+def _quote_filter_value(value: str) -> str:
+    """Quotes a value for use inside a PostgREST or=(...) filter."""
+    return '"' + value.replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+@_local_read()
+async def get_catalog_key(item_type: str, item_id: int) -> tuple[str, str] | None:
+    """Returns the (name, type) browse key of a movie or webseries by id, or None."""
     client = get_supabase_client()
     try:
-        response = (
-            client.table("webseries")
-            .select("id", count="exact")
-            .eq("category", category)
-            .execute()
+        response = await _execute(
+            client.table("catalog").select("name").eq("type", item_type).eq("id", item_id).limit(1)
         )
-        return response.count
+        if response.data:
+            return (response.data[0]["name"], item_type)
     except Exception as e:
-        logger.error(
-            f"Error counting webseries in category from Supabase: {e}", exc_info=True
-        )
-    return 0
+        logger.error(f"Error getting browse key from Supabase: {e}", exc_info=True)
+    return None
 
 
-async def count_webseries():
+@_local_read()
+async def browse_category(
+    category: str, key: tuple[str, str] | None, direction: str, limit: int
+) -> list[dict] | None:
+    """
+    Returns up to 'limit' items [{"id", "name", "type"}] of 'category' that come
+    after 'key' (direction "next") or before it ("prev"), in (name, type) order.
+    No key means the start of the category. One query against the catalog view.
+    Returns None on failure.
+    """
     client = get_supabase_client()
+    descending = direction == "prev"
+    query = client.table("catalog").select("id, name, type").eq("category", category)
+    if key is not None:
+        name, key_type = key
+        operator = "lt" if descending else "gt"
+        quoted_name = _quote_filter_value(name)
+        query = query.or_(
+            f"name.{operator}.{quoted_name},"
+            f"and(name.eq.{quoted_name},type_order.{operator}.{BROWSE_TYPE_ORDER[key_type]})"
+        )
+    query = query.order("name", desc=descending).order("type_order", desc=descending).limit(limit)
     try:
-        response = client.table("webseries").select("id", count="exact").execute()
-        return response.count
+        response = await _execute(query)
     except Exception as e:
-        logger.error(f"Error counting webseries from Supabase: {e}", exc_info=True)
-    return 0
+        logger.error(f"Error browsing category '{category}' in Supabase: {e}", exc_info=True)
+        return None
+
+    items = [{"id": row["id"], "name": row["name"], "type": row["type"]} for row in response.data]
+    if descending:
+        items.reverse()
+    return items
+
+
+@_read_through
+async def browse_category_page(
+    category: str,
+    direction: str = "next",
+    cursor_type: str | None = None,
+    cursor_id: int | None = None,
+    limit: int = 10,
+) -> dict | None:
+    """
+    Returns {"items", "has_more"} for the page after (or before) the item given by
+    cursor_type/cursor_id, where has_more says whether the category continues in
+    that direction. Returns None if the cursor item no longer exists or on failure.
+    Pages are cached, so prefetching the next page makes "Next" a cache hit.
+    """
+    key = None
+    if cursor_id is not None:
+        key = await get_catalog_key(cursor_type, cursor_id)
+        if key is None:
+            return None
+    items = await browse_category(category, key, direction, limit + 1)
+    if items is None:
+        return None
+    if direction == "prev":
+        return {"items": items[-limit:], "has_more": len(items) > limit}
+    return {"items": items[:limit], "has_more": len(items) > limit}
@@ -0,0 +1,92 @@
+import logging
+from collections import Counter
+
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+
+class HttpClients:
+    """
+    Long-lived aiohttp sessions, one per upstream, so requests reuse pooled
+    keep-alive connections and cached DNS answers instead of paying connection
+    setup on every call. Each upstream is configured with its own connection
+    limits and default timeout; a trace config counts requests, new versus
+    reused connections and DNS cache hits per upstream for stats().
+    """
+
+    def __init__(self, keepalive_timeout: float = 30, dns_cache_ttl: int = 300):
+        self.keepalive_timeout = keepalive_timeout
+        self.dns_cache_ttl = dns_cache_ttl
+        self._configs: dict[str, dict] = {}
+        self._sessions: dict[str, aiohttp.ClientSession] = {}
+        self._counters: dict[str, Counter] = {}
+
+    def register(self, name: str, limit: int, limit_per_host: int = 0, timeout: float = 30):
+        self._configs[name] = {"limit": limit, "limit_per_host": limit_per_host, "timeout": timeout}
+        self._counters[name] = Counter()
+
+    def _trace_config(self, name: str) -> aiohttp.TraceConfig:
+        counters = self._counters[name]
+        trace_config = aiohttp.TraceConfig()
+
+        def counting(event: str):
+            async def count(session, context, params):
+                counters[event] += 1
+            return count
+
+        trace_config.on_request_start.append(counting("requests"))
+        trace_config.on_request_exception.append(counting("errors"))
+        trace_config.on_connection_create_end.append(counting("connections_created"))
+        trace_config.on_connection_reuseconn.append(counting("connections_reused"))
+        trace_config.on_dns_cache_hit.append(counting("dns_cache_hits"))
+        trace_config.on_dns_cache_miss.append(counting("dns_cache_misses"))
+        return trace_config
+
+    def _create(self, name: str) -> aiohttp.ClientSession:
+        config = self._configs[name]
+        connector = aiohttp.TCPConnector(
+            limit=config["limit"],
+            limit_per_host=config["limit_per_host"],
+            keepalive_timeout=self.keepalive_timeout,
+            ttl_dns_cache=self.dns_cache_ttl,
+        )
+        return aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=config["timeout"]),
+            trace_configs=[self._trace_config(name)],
+        )
+
+    def start(self):
+        """Opens a session for every registered upstream. Must run inside the event loop."""
+        for name in self._configs:
+            self.get(name)
+
+    def get(self, name: str) -> aiohttp.ClientSession:
+        """Returns the upstream's session, (re)opening it if it is not open."""
+        session = self._sessions.get(name)
+        if session is None or session.closed:
+            session = self._sessions[name] = self._create(name)
+        return session
+
+    async def close(self):
+        for name, session in self._sessions.items():
+            try:
+                await session.close()
+            except Exception as e:
+                logger.error(f"Error closing HTTP session '{name}': {e}", exc_info=True)
+        self._sessions.clear()
+
+    def stats(self) -> dict:
+        return {
+            name: {
+                "limit": config["limit"],
+                "open": name in self._sessions and not self._sessions[name].closed,
+                **{
+                    event: self._counters[name][event]
+                    for event in ("requests", "errors", "connections_created", "connections_reused",
+                                  "dns_cache_hits", "dns_cache_misses")
+                },
+            }
+            for name, config in self._configs.items()
+        }
@@ -0,0 +1,85 @@
+import time
+from datetime import datetime, timezone
+
+# Weight of the latest request in a key's error rate (exponential moving average).
+ERROR_RATE_WEIGHT = 0.1
+# Keys whose error rate is above this are only used when no healthier key is left.
+UNHEALTHY_ERROR_RATE = 0.5
+
+
+def _utc_day() -> str:
+    return datetime.now(timezone.utc).strftime("%Y-%m-%d")
+
+
+class ApiKeyPool:
+    """
+    Schedules requests across a set of API keys. Each key tracks its requests
+    for the current UTC day, a cooldown set when the upstream reports it as
+    rate-limited, and a moving error rate. acquire() hands out the least used
+    healthy key, so load is spread evenly and exhausted keys are skipped
+    without a request until their cooldown ends or the day rolls over.
+    """
+
+    def __init__(self, keys: list[str], daily_limit: int = 1000, cooldown: float = 3600):
+        self.keys = list(keys)
+        self.daily_limit = daily_limit
+        self.cooldown = cooldown
+        self._day = _utc_day()
+        self._used_today = [0] * len(self.keys)
+        self._cooldown_until = [0.0] * len(self.keys)
+        self._error_rate = [0.0] * len(self.keys)
+        self._requests = [0] * len(self.keys)
+
+    def _roll_day(self):
+        day = _utc_day()
+        if day != self._day:
+            self._day = day
+            self._used_today = [0] * len(self.keys)
+            # Daily quotas reset with the day, so do the cooldowns they caused.
+            self._cooldown_until = [0.0] * len(self.keys)
+
+    def _available(self, index: int, now: float) -> bool:
+        return self._cooldown_until[index] <= now and self._used_today[index] < self.daily_limit
+
+    def acquire(self) -> int | None:
+        """Returns the index of the key to use next and counts the request, or None if all are exhausted."""
+        self._roll_day()
+        now = time.monotonic()
+        candidates = [i for i in range(len(self.keys)) if self._available(i, now)]
+        if not candidates:
+            return None
+        index = min(
+            candidates,
+            key=lambda i: (self._error_rate[i] > UNHEALTHY_ERROR_RATE, self._used_today[i], self._error_rate[i]),
+        )
+        self._used_today[index] += 1
+        self._requests[index] += 1
+        return index
+
+    def _record(self, index: int, failed: bool):
+        self._error_rate[index] += ERROR_RATE_WEIGHT * (float(failed) - self._error_rate[index])
+
+    def record_success(self, index: int):
+        self._record(index, False)
+
+    def record_error(self, index: int):
+        self._record(index, True)
+
+    def record_rate_limited(self, index: int):
+        """Takes the key out of rotation for 'cooldown' seconds."""
+        self._cooldown_until[index] = time.monotonic() + self.cooldown
+
+    def health(self) -> list[dict]:
+        self._roll_day()
+        now = time.monotonic()
+        return [
+            {
+                "index": i,
+                "available": self._available(i, now),
+                "cooldown_remaining": max(0.0, self._cooldown_until[i] - now),
+                "used_today": self._used_today[i],
+                "requests": self._requests[i],
+                "error_rate": self._error_rate[i],
+            }
+            for i in range(len(self.keys))
+        ]
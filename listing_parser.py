@@ -0,0 +1,165 @@
+import re
+import html
+import logging
+from typing import NamedTuple
+
+from bs4 import BeautifulSoup
+
+logger = logging.getLogger(__name__)
+
+
+class ListingEntry(NamedTuple):
+    href: str | None
+    text: str
+    size_bytes: int | None
+    modified: str | None
+
+
+# Apache, nginx and lighttpd all title their autoindex pages "Index of /path".
+_INDEX_MARKER_RE = re.compile(r"<(?:title|h1)>\s*Index of ", re.IGNORECASE)
+# href values may be double-quoted, single-quoted or bare.
+_ANCHOR_RE = re.compile(
+    r"""<a\s[^>]*?href\s*=\s*(?:(["'])(.*?)\1|([^\s>]+))[^>]*>(.*?)</a\s*>""",
+    re.IGNORECASE | re.DOTALL,
+)
+_ANCHOR_START_RE = re.compile(r"<a\s", re.IGNORECASE)
+_TAG_RE = re.compile(r"<[^>]*>")
+# Date column formats: Apache "2024-05-01 10:00", nginx "01-May-2024 10:00",
+# lighttpd "2024-May-01 10:00:00". The size column follows the date.
+_META_RE = re.compile(
+    r"(\d{4}-\d{2}-\d{2}\s+\d{1,2}:\d{2}(?::\d{2})?"
+    r"|\d{1,2}-[A-Za-z]{3}-\d{4}\s+\d{1,2}:\d{2}(?::\d{2})?"
+    r"|\d{4}-[A-Za-z]{3}-\d{1,2}\s+\d{1,2}:\d{2}(?::\d{2})?)"
+    r"\s+(\S+)"
+)
+_SIZE_RE = re.compile(r"^(\d+(?:\.\d+)?)([KMGTP]?)(?:i?B)?$", re.IGNORECASE)
+_SIZE_UNITS = {"": 1, "K": 1024, "M": 1024**2, "G": 1024**3, "T": 1024**4, "P": 1024**5}
+
+
+def parse_size(size_text: str) -> int | None:
+    """Converts an autoindex size column ('1.4G', '700M', '123456', '-') to bytes."""
+    match = _SIZE_RE.match(size_text.strip())
+    if not match:
+        return None
+    return int(float(match.group(1)) * _SIZE_UNITS[match.group(2).upper()])
+
+
+def parse_autoindex(content: str) -> list[ListingEntry] | None:
+    """
+    Extracts every link from an Apache/nginx/lighttpd autoindex page in a single
+    regex pass, together with the size and modified-date columns printed on the
+    same row. Returns None if the page does not look like an autoindex listing, or
+    if some <a> tag could not be parsed, so no link is ever silently dropped.
+    """
+    if not _INDEX_MARKER_RE.search(content, 0, 4096):
+        return None
+
+    entries = []
+    for match in _ANCHOR_RE.finditer(content):
+        href = match.group(2) if match.group(1) else match.group(3)
+        if "&" in href:
+            href = html.unescape(href)
+        text = match.group(4)
+        if "<" in text:
+            text = _TAG_RE.sub("", text)
+        if "&" in text:
+            text = html.unescape(text)
+
+        # The columns for this entry sit between the closing </a> and the end of the row.
+        row_end = content.find("\n", match.end())
+        if row_end == -1:
+            row_end = len(content)
+        tail = content[match.end():row_end]
+        next_anchor = _ANCHOR_START_RE.search(tail)
+        if next_anchor:
+            tail = tail[: next_anchor.start()]
+
+        size_bytes = modified = None
+        if "<" in tail:
+            tail = _TAG_RE.sub(" ", tail)
+        meta = _META_RE.search(tail.replace("&nbsp;", " "))
+        if meta:
+            modified = " ".join(meta.group(1).split())
+            size_bytes = parse_size(meta.group(2))
+
+        entries.append(ListingEntry(href, text, size_bytes, modified))
+
+    anchors = len(_ANCHOR_START_RE.findall(content))
+    if anchors != len(entries):
+        logger.debug(f"Parsed {len(entries)} of {anchors} links in an autoindex page.")
+        return None
+    return entries
+
+
+def parse_listing_links(content: str) -> list[ListingEntry]:
+    """
+    Returns the links of a directory listing. Autoindex pages go through the fast
+    parser; anything it does not recognise falls back to BeautifulSoup, in which
+    case size and modified are None.
+    """
+    entries = parse_autoindex(content)
+    if entries is not None:
+        return entries
+
+    logger.debug("Unrecognised listing format, falling back to BeautifulSoup.")
+    soup = BeautifulSoup(content, "html.parser")
+    return [ListingEntry(link.get("href"), link.text, None, None) for link in soup.find_all("a")]
+
+
+def _synthetic_apache_listing(entries: int) -> str:
+    rows = [
+        '<tr><td valign="top"><img src="/icons/movie.gif" alt="[VID]"></td>'
+        f'<td><a href="Movie%20{i}%20%282021%29%20720p.mkv">Movie {i} (2021) 720p.mkv</a></td>'
+        f'<td align="right">2024-05-{i % 28 + 1:02d} 10:{i % 60:02d}  </td>'
+        f'<td align="right">{(i % 900) / 10 + 0.7:.1f}G</td><td>&nbsp;</td></tr>'
+        for i in range(entries)
+    ]
+    return (
+        "<!DOCTYPE HTML PUBLIC \"-//W3C//DTD HTML 3.2 Final//EN\">\n<html>\n<head>\n"
+        "<title>Index of /Data/movies/Hollywood/2024</title>\n</head>\n<body>\n"
+        "<h1>Index of /Data/movies/Hollywood/2024</h1>\n<table>\n"
+        '<tr><th valign="top"><img src="/icons/blank.gif" alt="[ICO]"></th>'
+        '<th><a href="?C=N;O=D">Name</a></th><th><a href="?C=M;O=A">Last modified</a></th>'
+        '<th><a href="?C=S;O=A">Size</a></th></tr>\n'
+        '<tr><td valign="top"><img src="/icons/back.gif" alt="[PARENTDIR]"></td>'
+        '<td><a href="/Data/movies/Hollywood/">Parent Directory</a></td><td>&nbsp;</td>'
+        '<td align="right">  - </td></tr>\n'
+        + "\n".join(rows)
+        + "\n</table>\n</body></html>\n"
+    )
+
+
+def _synthetic_nginx_listing(entries: int) -> str:
+    rows = [
+        f'<a href="Series%20{i}/">Series {i}/</a>' + " " * 30 + f"{i % 28 + 1:02d}-May-2024 10:00" + " " * 20 + "-"
+        if i % 10 == 0
+        else f'<a href="Episode%20{i}.mp4">Episode {i}.mp4</a>' + " " * 30 + f"{i % 28 + 1:02d}-May-2024 10:00" + " " * 10 + str(700000000 + i)
+        for i in range(entries)
+    ]
+    return (
+        "<html>\n<head><title>Index of /Data/tvseries/English/</title></head>\n<body>\n"
+        "<h1>Index of /Data/tvseries/English/</h1><hr><pre><a href=\"../\">../</a>\n"
+        + "\n".join(rows)
+        + "\n</pre><hr></body>\n</html>\n"
+    )
+
+
+if __name__ == "__main__":
+    # Benchmark: python listing_parser.py [entries]
+    import sys
+    import timeit
+
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    for label, page in (("apache", _synthetic_apache_listing(count)), ("nginx", _synthetic_nginx_listing(count))):
+        fast = parse_autoindex(page)
+        soup_links = [(link.get("href"), link.text) for link in BeautifulSoup(page, "html.parser").find_all("a")]
+        assert [(e.href, e.text) for e in fast] == soup_links, f"{label}: parser output differs from BeautifulSoup"
+        assert sum(1 for e in fast if e.size_bytes is not None) >= count * 0.9, f"{label}: sizes missing"
+
+        fast_time = min(timeit.repeat(lambda: parse_autoindex(page), number=1, repeat=5))
+        soup_time = min(timeit.repeat(lambda: BeautifulSoup(page, "html.parser").find_all("a"), number=1, repeat=3))
+        print(
+            f"{label:>6}: {count} entries, {len(page) / 1024:.0f} KiB | "
+            f"fast parser {fast_time * 1000:.1f} ms | BeautifulSoup {soup_time * 1000:.1f} ms | "
+            f"{soup_time / fast_time:.1f}x faster"
+        )
@@ -0,0 +1,559 @@
+import sqlite3
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Mirrors schema.sql. Search goes through external-content FTS5 tables over
+# normalized_name that triggers keep in step with movies and webseries.
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS movies (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    url TEXT NOT NULL,
+    type TEXT NOT NULL,
+    normalized_name TEXT NOT NULL,
+    category TEXT,
+    source TEXT NOT NULL DEFAULT 'scraped',
+    last_updated INTEGER
+);
+CREATE INDEX IF NOT EXISTS movies_category_name_idx ON movies (category, name);
+CREATE INDEX IF NOT EXISTS movies_normalized_name_idx ON movies (normalized_name);
+
+CREATE TABLE IF NOT EXISTS users (
+    user_id INTEGER PRIMARY KEY
+);
+
+CREATE TABLE IF NOT EXISTS requests (
+    id INTEGER PRIMARY KEY,
+    user_id INTEGER NOT NULL,
+    movie_title TEXT NOT NULL,
+    timestamp INTEGER
+);
+
+CREATE TABLE IF NOT EXISTS request_counts (
+    normalized_title TEXT PRIMARY KEY,
+    title TEXT NOT NULL,
+    request_count INTEGER NOT NULL DEFAULT 0,
+    last_requested INTEGER
+);
+CREATE INDEX IF NOT EXISTS request_counts_top_idx ON request_counts (request_count DESC);
+
+CREATE TABLE IF NOT EXISTS webseries (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    category TEXT,
+    poster_url TEXT,
+    plot TEXT,
+    normalized_name TEXT NOT NULL,
+    last_updated INTEGER
+);
+CREATE INDEX IF NOT EXISTS webseries_name_idx ON webseries (name);
+CREATE INDEX IF NOT EXISTS webseries_category_name_idx ON webseries (category, name);
+
+CREATE TABLE IF NOT EXISTS episodes (
+    id INTEGER PRIMARY KEY,
+    series_id INTEGER NOT NULL REFERENCES webseries (id) ON DELETE CASCADE,
+    season_number INTEGER NOT NULL,
+    episode_number INTEGER NOT NULL,
+    url TEXT NOT NULL,
+    episode_name TEXT,
+    UNIQUE (series_id, season_number, episode_number)
+);
+
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    movie_name TEXT NOT NULL REFERENCES movies (name) ON DELETE CASCADE ON UPDATE CASCADE,
+    position INTEGER NOT NULL,
+    url TEXT NOT NULL,
+    display_name TEXT NOT NULL,
+    size TEXT,
+    modified TEXT,
+    last_seen INTEGER NOT NULL,
+    UNIQUE (movie_name, url)
+);
+CREATE INDEX IF NOT EXISTS files_movie_position_idx ON files (movie_name, position);
+
+CREATE VIEW IF NOT EXISTS catalog AS
+    SELECT id, name, 'movie' AS type, 0 AS type_order, category, normalized_name FROM movies
+    UNION ALL
+    SELECT id, name, 'webseries' AS type, 1 AS type_order, category, normalized_name FROM webseries;
+
+CREATE VIRTUAL TABLE IF NOT EXISTS movies_fts USING fts5(
+    normalized_name, content='movies', content_rowid='id'
+);
+CREATE TRIGGER IF NOT EXISTS movies_fts_ai AFTER INSERT ON movies BEGIN
+    INSERT INTO movies_fts (rowid, normalized_name) VALUES (new.id, new.normalized_name);
+END;
+CREATE TRIGGER IF NOT EXISTS movies_fts_ad AFTER DELETE ON movies BEGIN
+    INSERT INTO movies_fts (movies_fts, rowid, normalized_name) VALUES ('delete', old.id, old.normalized_name);
+END;
+CREATE TRIGGER IF NOT EXISTS movies_fts_au AFTER UPDATE ON movies BEGIN
+    INSERT INTO movies_fts (movies_fts, rowid, normalized_name) VALUES ('delete', old.id, old.normalized_name);
+    INSERT INTO movies_fts (rowid, normalized_name) VALUES (new.id, new.normalized_name);
+END;
+
+CREATE VIRTUAL TABLE IF NOT EXISTS webseries_fts USING fts5(
+    normalized_name, content='webseries', content_rowid='id'
+);
+CREATE TRIGGER IF NOT EXISTS webseries_fts_ai AFTER INSERT ON webseries BEGIN
+    INSERT INTO webseries_fts (rowid, normalized_name) VALUES (new.id, new.normalized_name);
+END;
+CREATE TRIGGER IF NOT EXISTS webseries_fts_ad AFTER DELETE ON webseries BEGIN
+    INSERT INTO webseries_fts (webseries_fts, rowid, normalized_name) VALUES ('delete', old.id, old.normalized_name);
+END;
+CREATE TRIGGER IF NOT EXISTS webseries_fts_au AFTER UPDATE ON webseries BEGIN
+    INSERT INTO webseries_fts (webseries_fts, rowid, normalized_name) VALUES ('delete', old.id, old.normalized_name);
+    INSERT INTO webseries_fts (rowid, normalized_name) VALUES (new.id, new.normalized_name);
+END;
+"""
+
+# Columns copied when mirroring Supabase tables, in dependency order. The append-only
+# users and requests tables are not mirrored: only the "sqlite" backend keeps them locally.
+MIRRORED_TABLES = {
+    "movies": ("id", "name", "url", "type", "normalized_name", "category", "source", "last_updated"),
+    "webseries": ("id", "name", "category", "poster_url", "plot", "normalized_name", "last_updated"),
+    "episodes": ("id", "series_id", "season_number", "episode_number", "url", "episode_name"),
+    "files": ("id", "movie_name", "position", "url", "display_name", "size", "modified", "last_seen"),
+    "request_counts": ("normalized_title", "title", "request_count", "last_requested"),
+}
+
+# Names per IN (...) query, well below SQLite's bound-parameter limit.
+NAME_CHUNK_SIZE = 500
+
+
+def _fts_query(normalized_query: str) -> str | None:
+    """Turns a normalized query into an FTS5 query requiring every word as a whole token."""
+    words = normalized_query.split()
+    if not words:
+        return None
+    return " ".join(f'"{word}"' for word in words)
+
+
+def _check_counted_table(table: str):
+    if table not in ("movies", "webseries", "catalog"):
+        raise ValueError(f"Cannot count table '{table}'.")
+
+
+class LocalDatabase:
+    """
+    SQLite implementation of the database.py API. Methods are synchronous and
+    return the same shapes as their Supabase counterparts; database.py runs them
+    on its thread pool. One connection is shared behind a lock.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA foreign_keys=ON")
+        self._conn.executescript(SCHEMA)
+        logger.info(f"Opened local database at {path}.")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _query(self, sql: str, params: tuple = ()) -> list[sqlite3.Row]:
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def _scalar(self, sql: str, params: tuple = ()):
+        rows = self._query(sql, params)
+        return rows[0][0] if rows else None
+
+    # --- Mirroring ---
+    def replace_all(self, tables: dict[str, list[dict]]):
+        """Atomically replaces the given tables with rows fetched from Supabase."""
+        with self._lock, self._conn:
+            # Children first so cascades don't fire on rows we are about to drop anyway.
+            for table in reversed(MIRRORED_TABLES):
+                if table in tables:
+                    self._conn.execute(f"DELETE FROM {table}")
+            for table, columns in MIRRORED_TABLES.items():
+                if table not in tables:
+                    continue
+                placeholders = ", ".join("?" for _ in columns)
+                self._conn.executemany(
+                    f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders})",
+                    [tuple(row.get(column) for column in columns) for row in tables[table]],
+                )
+        logger.info(
+            "Local replica synced: "
+            + ", ".join(f"{len(rows)} {table}" for table, rows in tables.items())
+        )
+
+    # --- Count Functions ---
+    def count_rows(self, table: str, category: str | None = None, estimated: bool = False) -> int:
+        _check_counted_table(table)
+        if category is None:
+            return self._scalar(f"SELECT COUNT(*) FROM {table}")
+        return self._scalar(f"SELECT COUNT(*) FROM {table} WHERE category = ?", (category,))
+
+    def count_catalog_by_category(self) -> dict:
+        category_counts = {"movies": {}, "webseries": {}}
+        for row in self._query("SELECT type, category, COUNT(*) FROM catalog GROUP BY type, category"):
+            category_counts["movies" if row[0] == "movie" else "webseries"][row[1]] = row[2]
+        return category_counts
+
+    # --- User Functions ---
+    def add_user(self, user_id: int) -> bool:
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR IGNORE INTO users (user_id) VALUES (?)", (user_id,))
+        return True
+
+    def add_users(self, user_ids: list[int]) -> bool:
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO users (user_id) VALUES (?)", [(user_id,) for user_id in user_ids]
+            )
+        return True
+
+    def get_user_id_page(self, after_user_id: int | None, limit: int) -> list[int]:
+        rows = self._query(
+            "SELECT user_id FROM users WHERE user_id > ? ORDER BY user_id LIMIT ?",
+            (after_user_id if after_user_id is not None else -(2**63), limit),
+        )
+        return [row["user_id"] for row in rows]
+
+    # --- Movie Functions ---
+    def clear_scraped_movies(self) -> bool:
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM movies WHERE source = 'scraped'")
+        return True
+
+    def add_movie_batch(self, movie_items: list, ids: dict[str, int] | None = None) -> dict[str, int]:
+        """Upserts movies by name; 'ids' ({name: id}) keeps mirrored rows' Supabase ids."""
+        ids = ids or {}
+        timestamp = int(time.time())
+        names = [item["original_name"] for item in movie_items]
+        with self._lock, self._conn:
+            self._conn.executemany(
+                """
+                INSERT INTO movies (id, name, url, type, normalized_name, category, source, last_updated)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (name) DO UPDATE SET
+                    id = COALESCE(excluded.id, movies.id),
+                    url = excluded.url, type = excluded.type,
+                    normalized_name = excluded.normalized_name, category = excluded.category,
+                    source = excluded.source, last_updated = excluded.last_updated
+                """,
+                [
+                    (
+                        ids.get(item["original_name"]), item["original_name"], item["url"], item["type"],
+                        item["normalized"], item["category"], item.get("source", "scraped"), timestamp,
+                    )
+                    for item in movie_items
+                ],
+            )
+            stored = {}
+            for start in range(0, len(names), NAME_CHUNK_SIZE):
+                chunk = names[start : start + NAME_CHUNK_SIZE]
+                stored.update(
+                    self._conn.execute(
+                        f"SELECT name, id FROM movies WHERE name IN ({', '.join('?' for _ in chunk)})",
+                        tuple(chunk),
+                    ).fetchall()
+                )
+        return stored
+
+    def get_scraped_movies_snapshot(self) -> dict:
+        rows = self._query("SELECT name, url, type, category FROM movies WHERE source = 'scraped'")
+        return {
+            row["name"]: {"url": row["url"], "type": row["type"], "category": row["category"]}
+            for row in rows
+        }
+
+    def delete_movies_by_names(self, names: list[str]) -> bool:
+        with self._lock, self._conn:
+            for start in range(0, len(names), NAME_CHUNK_SIZE):
+                chunk = names[start : start + NAME_CHUNK_SIZE]
+                self._conn.execute(
+                    f"DELETE FROM movies WHERE source = 'scraped' AND name IN ({', '.join('?' for _ in chunk)})",
+                    tuple(chunk),
+                )
+        return True
+
+    def _search(self, table: str, normalized_query: str, limit: int) -> list[sqlite3.Row]:
+        fts_query = _fts_query(normalized_query)
+        if fts_query is None:
+            return []
+        return self._query(
+            f"""
+            SELECT t.name, t.category FROM {table}_fts
+            JOIN {table} t ON t.id = {table}_fts.rowid
+            WHERE {table}_fts MATCH ? ORDER BY t.id LIMIT ?
+            """,
+            (fts_query, limit),
+        )
+
+    def search_movies_by_normalized_name(self, normalized_query: str, limit: int = 15):
+        return [row["name"] for row in self._search("movies", normalized_query, limit)]
+
+    def search_webseries_by_normalized_name(self, normalized_query: str, limit: int = 15):
+        return [row["name"] for row in self._search("webseries", normalized_query, limit)]
+
+    def search_catalog_by_normalized_name(self, normalized_query: str, limit: int = 15):
+        fts_query = _fts_query(normalized_query)
+        if fts_query is None:
+            return []
+        rows = self._query(
+            """
+            SELECT * FROM (
+                SELECT m.id, m.name, 'movie' AS type, m.category FROM movies_fts
+                JOIN movies m ON m.id = movies_fts.rowid WHERE movies_fts MATCH ?
+                ORDER BY m.id LIMIT ?
+            )
+            UNION ALL
+            SELECT * FROM (
+                SELECT w.id, w.name, 'webseries' AS type, w.category FROM webseries_fts
+                JOIN webseries w ON w.id = webseries_fts.rowid WHERE webseries_fts MATCH ?
+                ORDER BY w.id LIMIT ?
+            )
+            """,
+            (fts_query, limit, fts_query, limit),
+        )
+        results = []
+        seen = set()
+        for row in rows:
+            if row["name"] not in seen:
+                seen.add(row["name"])
+                results.append(
+                    {"id": row["id"], "name": row["name"], "type": row["type"], "category": row["category"]}
+                )
+        return results
+
+    def get_movie_details(self, name: str):
+        rows = self._query(
+            "SELECT name, url, type, category, source FROM movies WHERE name = ? LIMIT 1", (name,)
+        )
+        if rows:
+            row = rows[0]
+            return {
+                "original_name": row["name"],
+                "url": row["url"],
+                "type": row["type"],
+                "category": row["category"],
+                "source": row["source"] or "scraped",
+            }
+        return None
+
+    def get_movie_by_normalized_name(self, normalized_name: str):
+        rows = self._query(
+            "SELECT name, url, type, category, source FROM movies WHERE normalized_name = ? LIMIT 1",
+            (normalized_name,),
+        )
+        return dict(rows[0]) if rows else None
+
+    def add_single_movie(
+        self,
+        name: str,
+        url: str,
+        item_type: str,
+        normalized_name: str,
+        category: str,
+        source: str = "manual",
+        movie_id: int | None = None,
+    ) -> int | None:
+        """Upserts one movie; 'movie_id' keeps a mirrored row's Supabase id."""
+        return self.add_movie_batch(
+            [
+                {
+                    "original_name": name,
+                    "url": url,
+                    "type": item_type,
+                    "normalized": normalized_name,
+                    "category": category,
+                    "source": source,
+                }
+            ],
+            ids={name: movie_id} if movie_id is not None else None,
+        ).get(name)
+
+    # --- File Index Functions ---
+    def get_files_for_movie(self, movie_name: str) -> list:
+        rows = self._query(
+            """
+            SELECT url, display_name, size, modified, last_seen FROM files
+            WHERE movie_name = ? ORDER BY position
+            """,
+            (movie_name,),
+        )
+        return [dict(row) for row in rows]
+
+    def replace_files_for_movie(self, movie_name: str, files: list) -> bool:
+        timestamp = int(time.time())
+        with self._lock, self._conn:
+            self._conn.executemany(
+                """
+                INSERT INTO files (movie_name, position, url, display_name, size, modified, last_seen)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (movie_name, url) DO UPDATE SET
+                    position = excluded.position, display_name = excluded.display_name,
+                    size = excluded.size, modified = excluded.modified, last_seen = excluded.last_seen
+                """,
+                [
+                    (movie_name, position, url, display_name, size, modified, timestamp)
+                    for position, (url, display_name, size, modified) in enumerate(files)
+                ],
+            )
+            self._conn.execute(
+                "DELETE FROM files WHERE movie_name = ? AND last_seen < ?", (movie_name, timestamp)
+            )
+        return True
+
+    # --- Request Functions ---
+    def add_request(self, user_id: int, movie_title: str, normalized_title: str) -> bool:
+        timestamp = int(time.time())
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO requests (user_id, movie_title, timestamp) VALUES (?, ?, ?)",
+                (user_id, movie_title, timestamp),
+            )
+            self._conn.execute(
+                """
+                INSERT INTO request_counts (normalized_title, title, request_count, last_requested)
+                VALUES (?, ?, 1, ?)
+                ON CONFLICT (normalized_title) DO UPDATE SET
+                    request_count = request_count + 1,
+                    title = excluded.title, last_requested = excluded.last_requested
+                """,
+                (normalized_title, movie_title, timestamp),
+            )
+        return True
+
+    def get_requests(self, limit: int = 10):
+        rows = self._query(
+            "SELECT title, request_count FROM request_counts ORDER BY request_count DESC LIMIT ?",
+            (limit,),
+        )
+        return [(row["title"], row["request_count"]) for row in rows]
+
+    def rebuild_request_counts(self, normalize) -> bool:
+        rows = self._query("SELECT movie_title, timestamp FROM requests ORDER BY id")
+        aggregates = {}
+        for row in rows:
+            key = normalize(row["movie_title"])
+            count = aggregates[key][1] + 1 if key in aggregates else 1
+            aggregates[key] = (row["movie_title"], count, row["timestamp"])
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM request_counts")
+            self._conn.executemany(
+                """
+                INSERT INTO request_counts (normalized_title, title, request_count, last_requested)
+                VALUES (?, ?, ?, ?)
+                """,
+                [(key, *aggregate) for key, aggregate in aggregates.items()],
+            )
+        return True
+
+    # --- Webseries Functions ---
+    def add_webseries(
+        self,
+        name: str,
+        category: str,
+        poster_url: str,
+        plot: str,
+        normalized_name: str,
+        series_id: int | None = None,
+    ) -> int | None:
+        """Inserts a webseries; 'series_id' keeps a mirrored row's Supabase id."""
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                """
+                INSERT INTO webseries (id, name, category, poster_url, plot, normalized_name, last_updated)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                """,
+                (series_id, name, category, poster_url, plot, normalized_name, int(time.time())),
+            )
+        return cursor.lastrowid
+
+    def add_episode(
+        self,
+        series_id: int,
+        season_number: int,
+        episode_number: int,
+        url: str,
+        episode_name: str | None = None,
+    ) -> bool:
+        with self._lock, self._conn:
+            self._conn.execute(
+                """
+                INSERT INTO episodes (series_id, season_number, episode_number, url, episode_name)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (series_id, season_number, episode_number) DO UPDATE SET
+                    url = excluded.url, episode_name = excluded.episode_name
+                """,
+                (series_id, season_number, episode_number, url, episode_name),
+            )
+        return True
+
+    def upsert_episodes(self, series_id: int, episodes: list[dict], stored: list[bool] | None = None) -> list[bool]:
+        """Upserts episodes; 'stored' mirrors only the entries Supabase accepted."""
+        if stored is not None:
+            episodes = [episode for episode, ok in zip(episodes, stored) if ok]
+        with self._lock, self._conn:
+            self._conn.executemany(
+                """
+                INSERT INTO episodes (series_id, season_number, episode_number, url, episode_name)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (series_id, season_number, episode_number) DO UPDATE SET
+                    url = excluded.url, episode_name = excluded.episode_name
+                """,
+                [
+                    (series_id, episode["season"], episode["episode"], episode["url"], episode.get("name"))
+                    for episode in episodes
+                ],
+            )
+        return [True] * len(episodes)
+
+    def get_webseries_details(self, name: str):
+        rows = self._query(
+            "SELECT id, name, category, poster_url, plot FROM webseries WHERE name = ? LIMIT 1", (name,)
+        )
+        return dict(rows[0]) if rows else None
+
+    def get_episodes_for_series(self, series_id: int):
+        rows = self._query(
+            """
+            SELECT season_number, episode_number, url, episode_name FROM episodes
+            WHERE series_id = ? ORDER BY season_number, episode_number
+            """,
+            (series_id,),
+        )
+        return [
+            {
+                "season": row["season_number"],
+                "episode": row["episode_number"],
+                "url": row["url"],
+                "name": row["episode_name"],
+            }
+            for row in rows
+        ]
+
+    # --- Browse Functions ---
+    def get_catalog_key(self, item_type: str, item_id: int):
+        rows = self._query("SELECT name FROM catalog WHERE type = ? AND id = ?", (item_type, item_id))
+        return (rows[0]["name"], item_type) if rows else None
+
+    def browse_category(self, category: str, key, direction: str, limit: int) -> list[dict]:
+        comparison, order = ("<", "DESC") if direction == "prev" else (">", "ASC")
+        key_filter = ""
+        params = [category]
+        if key is not None:
+            key_filter = f"AND (name, type_order) {comparison} (?, ?)"
+            params += [key[0], 0 if key[1] == "movie" else 1]
+        rows = self._query(
+            f"""
+            SELECT id, name, type FROM catalog WHERE category = ? {key_filter}
+            ORDER BY name {order}, type_order {order} LIMIT ?
+            """,
+            (*params, limit),
+        )
+        items = [dict(row) for row in rows]
+        if direction == "prev":
+            items.reverse()
+        return items
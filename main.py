@@ -8,10 +8,30 @@ import time
 import sys
 import io
 import re
+import csv
+import html
 import logging
-from bs4 import BeautifulSoup
 from urllib.parse import urljoin, unquote, quote
 import database as db
+from listing_parser import parse_listing_links
+from user_registry import UserRegistry
+from metadata_store import MetadataStore, metadata_key
+from key_pool import ApiKeyPool
+from singleflight import SingleFlight
+from http_clients import HttpClients
+from short_url_store import ShortUrlStore
+from cache import TTLCache
+from crawler import (
+    CrawlScheduler,
+    CrawlStateStore,
+    conditional_headers,
+    content_hash,
+    LISTING_CHANGED,
+    LISTING_UNCHANGED,
+    LISTING_FAILED,
+    CRAWL_RESULT,
+    CRAWL_FOLLOW,
+)
 from telegram import (
     InlineKeyboardButton,
     InlineKeyboardMarkup,
@@ -53,9 +73,13 @@ logger = logging.getLogger(__name__)
 # --- Configuration ---
 OMDB_API_KEYS_STR = os.getenv("OMDB_API_KEYS") # Comma-separated keys
 OMDB_API_KEYS = [key.strip() for key in OMDB_API_KEYS_STR.split(',')] if OMDB_API_KEYS_STR else []
+# Requests each OMDb key may make per UTC day, and how long (seconds) a rate-limited key is skipped.
+OMDB_DAILY_LIMIT = int(os.getenv("OMDB_DAILY_LIMIT", "1000"))
+OMDB_KEY_COOLDOWN = int(os.getenv("OMDB_KEY_COOLDOWN", "3600"))
 SHRINKME_API_KEY = os.getenv("SHRINKME_API_KEY")
 BOT_TOKEN = os.getenv("BOT_TOKEN")
 LOG_CHANNEL_ID = os.getenv("LOG_CHANNEL_ID")
+CRAWL_STATE_PATH = os.getenv("CRAWL_STATE_PATH", "crawl_state.json")
 
 # Admin configuration
 ADMIN_IDS_STR = os.getenv("ADMIN_IDS")
@@ -170,13 +194,91 @@ FILES_PER_PAGE = 10
 METADATA_REQUEST_TIMEOUT = 30 
 VIDEO_EXTENSIONS = ('.mp4', '.mkv', '.avi', '.mov', '.wmv', '.flv', '.webm', '.mpeg', '.mpg')
 
+# Crawl concurrency: requests per host adapt between the min and max limits,
+# backing off when the average latency rises above the target (seconds).
+CRAWL_MAX_CONCURRENCY = int(os.getenv("CRAWL_MAX_CONCURRENCY", "8"))
+CRAWL_MIN_CONCURRENCY = int(os.getenv("CRAWL_MIN_CONCURRENCY", "1"))
+CRAWL_LATENCY_TARGET = float(os.getenv("CRAWL_LATENCY_TARGET", "2.0"))
+CRAWL_WORKERS = int(os.getenv("CRAWL_WORKERS", "16"))
+
+# Refresh pipeline: rows per upsert request and how many parsed rows may wait for the writer.
+DB_BATCH_SIZE = int(os.getenv("DB_BATCH_SIZE", "500"))
+REFRESH_QUEUE_SIZE = int(os.getenv("REFRESH_QUEUE_SIZE", "2000"))
+REFRESH_PROGRESS_INTERVAL = 5
+
+# File index: indexed directory listings older than this (seconds) are re-crawled in the background.
+FILE_INDEX_MAX_AGE = int(os.getenv("FILE_INDEX_MAX_AGE", str(6 * 60 * 60)))
+FILE_INDEX_CONCURRENCY = int(os.getenv("FILE_INDEX_CONCURRENCY", "4"))
+
+# /addwebseries episode lists: entry formats and limits for uploaded episode files.
+EPISODE_ID_RE = re.compile(r'^S(\d+)E(\d+)$', re.IGNORECASE)
+EPISODE_COLON_ENTRY_RE = re.compile(r'^S\d+E\d+\s*:', re.IGNORECASE)
+MAX_EPISODE_FILE_SIZE = 1024 * 1024
+MAX_REPORTED_EPISODE_ERRORS = 10
+
+# Item type codes used in browse callback cursors.
+BROWSE_TYPE_CODES = {"movie": "m", "webseries": "w"}
+
+# New users are stored in batches, at most this many seconds or ids apart.
+USER_FLUSH_INTERVAL = float(os.getenv("USER_FLUSH_INTERVAL", "10"))
+USER_FLUSH_SIZE = int(os.getenv("USER_FLUSH_SIZE", "100"))
+
+# OMDb metadata cache: found titles are kept for METADATA_CACHE_TTL seconds, titles
+# OMDb does not know for METADATA_NEGATIVE_TTL, and at most METADATA_CACHE_MAX_ENTRIES.
+METADATA_CACHE_PATH = os.getenv("METADATA_CACHE_PATH", "metadata_cache.sqlite3")
+METADATA_CACHE_TTL = int(os.getenv("METADATA_CACHE_TTL", str(7 * 24 * 60 * 60)))
+METADATA_NEGATIVE_TTL = int(os.getenv("METADATA_NEGATIVE_TTL", str(24 * 60 * 60)))
+METADATA_CACHE_MAX_ENTRIES = int(os.getenv("METADATA_CACHE_MAX_ENTRIES", "20000"))
+
+# Shortened links are kept on disk (at most SHORT_URL_CACHE_MAX_ENTRIES). Links of popular
+# and newly indexed items are shortened in the background every SHORTEN_PREFETCH_INTERVAL
+# seconds (or when new items are queued), at most SHORTEN_PREFETCH_RATE calls per second;
+# a rate of 0 turns pre-shortening off.
+SHORT_URL_CACHE_PATH = os.getenv("SHORT_URL_CACHE_PATH", "short_urls.sqlite3")
+SHORT_URL_CACHE_MAX_ENTRIES = int(os.getenv("SHORT_URL_CACHE_MAX_ENTRIES", "100000"))
+SHORTEN_PREFETCH_INTERVAL = int(os.getenv("SHORTEN_PREFETCH_INTERVAL", "900"))
+SHORTEN_PREFETCH_RATE = max(0.0, float(os.getenv("SHORTEN_PREFETCH_RATE", "2")))
+SHORTEN_PREFETCH_POPULAR = int(os.getenv("SHORTEN_PREFETCH_POPULAR", "20"))
+SHORTEN_PREFETCH_LINKS = int(os.getenv("SHORTEN_PREFETCH_LINKS", str(3 * FILES_PER_PAGE)))
+
+# Detail pages already posted to the log channel are forwarded again instead of being
+# rebuilt, for at most RENDERED_MESSAGE_TTL seconds (by default the file index age limit).
+RENDERED_MESSAGE_CACHE_SIZE = int(os.getenv("RENDERED_MESSAGE_CACHE_SIZE", "5000"))
+RENDERED_MESSAGE_TTL = int(os.getenv("RENDERED_MESSAGE_TTL", str(FILE_INDEX_MAX_AGE)))
+
+# Pooled HTTP sessions per upstream: connection limits, idle keep-alive and DNS cache TTL (seconds).
+HTTP_DIRECTORY_CONNECTIONS = int(os.getenv("HTTP_DIRECTORY_CONNECTIONS", "32"))
+HTTP_OMDB_CONNECTIONS = int(os.getenv("HTTP_OMDB_CONNECTIONS", "8"))
+HTTP_SHRINKME_CONNECTIONS = int(os.getenv("HTTP_SHRINKME_CONNECTIONS", "8"))
+HTTP_KEEPALIVE_TIMEOUT = float(os.getenv("HTTP_KEEPALIVE_TIMEOUT", "30"))
+HTTP_DNS_CACHE_TTL = int(os.getenv("HTTP_DNS_CACHE_TTL", "300"))
+
 # --- Caching ---
-metadata_cache = {}
-url_shorten_cache = {}
+metadata_cache = MetadataStore(METADATA_CACHE_PATH, METADATA_CACHE_TTL, METADATA_NEGATIVE_TTL, METADATA_CACHE_MAX_ENTRIES)
+# (item_type, item_name, page) -> message_id of the rendered detail page in the log channel.
+rendered_messages = TTLCache(RENDERED_MESSAGE_CACHE_SIZE, RENDERED_MESSAGE_TTL)
+short_urls = ShortUrlStore(SHORT_URL_CACHE_PATH, SHORT_URL_CACHE_MAX_ENTRIES)
+# (item_type, item_name) pairs waiting for their links to be pre-shortened, in queue order.
+shorten_prefetch_queue = {}
+shorten_prefetch_wakeup = asyncio.Event()
+omdb_keys = ApiKeyPool(OMDB_API_KEYS, OMDB_DAILY_LIMIT, OMDB_KEY_COOLDOWN)
+crawl_state = CrawlStateStore(CRAWL_STATE_PATH)
+crawl_scheduler = CrawlScheduler(CRAWL_MAX_CONCURRENCY, CRAWL_MIN_CONCURRENCY, CRAWL_LATENCY_TARGET, CRAWL_WORKERS)
+http_clients = HttpClients(HTTP_KEEPALIVE_TIMEOUT, HTTP_DNS_CACHE_TTL)
+http_clients.register("directory", HTTP_DIRECTORY_CONNECTIONS, timeout=REQUEST_TIMEOUT)
+http_clients.register("omdb", HTTP_OMDB_CONNECTIONS, timeout=METADATA_REQUEST_TIMEOUT)
+http_clients.register("shrinkme", HTTP_SHRINKME_CONNECTIONS, timeout=REQUEST_TIMEOUT)
+# Concurrent identical upstream requests (OMDb, crawls, HEAD probes, ShrinkMe) share one call.
+inflight = SingleFlight()
+background_tasks = set()
+# Refreshes share the catalog snapshot and crawl state, so only one may run at a time.
+refresh_lock = asyncio.Lock()
+user_registry = UserRegistry(db.add_users, USER_FLUSH_SIZE, USER_FLUSH_INTERVAL)
 
 # --- Tracking ---
 search_query_counts = {}
 item_selection_counts = {}
+selected_item_types = {}
 
 # --- Helper Functions ---
 def get_category(url: str) -> str:
@@ -193,34 +295,86 @@ def get_category(url: str) -> str:
 def is_admin(user_id: int) -> bool:
     return user_id in ADMIN_IDS
 
+def run_in_background(coro) -> asyncio.Task:
+    """Starts a fire-and-forget task and keeps a reference so it isn't garbage collected."""
+    task = asyncio.create_task(coro)
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+    return task
+
+def invalidate_rendered(item_type: str, item_name: str):
+    """Drops the rendered detail pages of an item whose files or metadata changed."""
+    rendered_messages.invalidate_prefix(item_type, item_name)
+
 async def fetch_url(session: aiohttp.ClientSession, url: str, retries: int = MAX_RETRIES, timeout: int = REQUEST_TIMEOUT):
     for attempt in range(retries):
         try:
-            async with session.get(url, timeout=aiohttp.ClientTimeout(total=timeout)) as response:
-                response.raise_for_status()
-                return await response.text()
+            async with crawl_scheduler.slot(url):
+                async with session.get(url, timeout=aiohttp.ClientTimeout(total=timeout)) as response:
+                    response.raise_for_status()
+                    return await response.text()
         except Exception as e:
             logger.warning(f"Attempt {attempt+1}/{retries} failed for {url}: {str(e)}")
             if attempt < retries - 1:
                 await asyncio.sleep(1 * (2 ** attempt))
     return None
 
+async def fetch_listing(session: aiohttp.ClientSession, url: str, fingerprint: dict | None, retries: int = MAX_RETRIES, timeout: int = REQUEST_TIMEOUT):
+    """
+    Conditionally fetches a directory listing using its stored fingerprint.
+    Returns (status, content, new_fingerprint) where status is one of
+    LISTING_CHANGED, LISTING_UNCHANGED or LISTING_FAILED.
+    """
+    headers = conditional_headers(fingerprint)
+    for attempt in range(retries):
+        try:
+            async with crawl_scheduler.slot(url):
+                async with session.get(url, headers=headers, timeout=aiohttp.ClientTimeout(total=timeout)) as response:
+                    if response.status == 304:
+                        return LISTING_UNCHANGED, None, fingerprint
+                    response.raise_for_status()
+                    content = await response.text()
+                    etag = response.headers.get("ETag")
+                    last_modified = response.headers.get("Last-Modified")
+                new_fingerprint = {
+                    "etag": etag,
+                    "last_modified": last_modified,
+                    "hash": content_hash(content),
+                }
+                # Servers without validators still let us skip parsing and DB writes.
+                if fingerprint and fingerprint.get("hash") == new_fingerprint["hash"]:
+                    return LISTING_UNCHANGED, None, new_fingerprint
+                return LISTING_CHANGED, content, new_fingerprint
+        except Exception as e:
+            logger.warning(f"Attempt {attempt+1}/{retries} failed for {url}: {str(e)}")
+            if attempt < retries - 1:
+                await asyncio.sleep(1 * (2 ** attempt))
+    return LISTING_FAILED, None, None
+
+def format_size(size_bytes: int) -> str:
+    """Formats a byte count for display on a download button."""
+    if size_bytes < 1024:
+        return f"{size_bytes} B"
+    elif size_bytes < 1024 * 1024:
+        return f"{size_bytes / 1024:.2f} KB"
+    elif size_bytes < 1024 * 1024 * 1024:
+        return f"{size_bytes / (1024 * 1024):.2f} MB"
+    else:
+        return f"{size_bytes / (1024 * 1024 * 1024):.2f} GB"
+
 async def get_file_size(session: aiohttp.ClientSession, url: str) -> str:
     """Gets the file size from a URL using a HEAD request."""
+    return await inflight.run(("head", url), probe_file_size, session, url)
+
+async def probe_file_size(session: aiohttp.ClientSession, url: str) -> str:
     try:
-        async with session.head(url, allow_redirects=True, timeout=REQUEST_TIMEOUT) as response:
-            response.raise_for_status()
-            if 'Content-Length' in response.headers:
-                size_bytes = int(response.headers['Content-Length'])
-                if size_bytes < 1024:
-                    return f"{size_bytes} B"
-                elif size_bytes < 1024 * 1024:
-                    return f"{size_bytes / 1024:.2f} KB"
-                elif size_bytes < 1024 * 1024 * 1024:
-                    return f"{size_bytes / (1024 * 1024):.2f} MB"
-                else:
-                    return f"{size_bytes / (1024 * 1024 * 1024):.2f} GB"
-            return "Size unknown"
+        async with crawl_scheduler.slot(url):
+            async with session.head(url, allow_redirects=True, timeout=REQUEST_TIMEOUT) as response:
+                response.raise_for_status()
+                content_length = response.headers.get('Content-Length')
+        if content_length is not None:
+            return format_size(int(content_length))
+        return "Size unknown"
     except Exception as e:
         logger.warning(f"File size error for {url}: {str(e)}")
     return "Size N/A"
@@ -233,50 +387,210 @@ def normalize_movie_name(name: str) -> str:
     logger.debug(f"Normalized '{original_name}' to '{normalized}'")
     return normalized
 
-async def search_movie(query: str):
-    """Searches for movies and web series in the database based on the query."""
+async def search_movie(query: str) -> list:
+    """
+    Searches for movies and web series in the database based on the query.
+    Returns [{"name", "type", "category"}] with duplicates removed, movies first.
+    """
     norm_query = normalize_movie_name(query)
-    movies = await db.search_movies_by_normalized_name(norm_query)
-    webseries = await db.search_webseries_by_normalized_name(norm_query)
-    
-    # Combine results and remove duplicates while preserving order
-    combined = movies + webseries
-    seen = set()
-    unique_results = [x for x in combined if not (x in seen or seen.add(x))]
-    return unique_results
-
-async def scrape_and_update_db():
-    """Scrapes all base URLs and updates the database with the findings."""
+    return await db.search_catalog_by_normalized_name(norm_query)
+
+def catalog_row(item: dict) -> tuple:
+    """The fields that decide whether a scraped row changed since the last refresh."""
+    return (item['url'], item['type'], item['category'])
+
+def find_vanished_names(existing: dict, scraped_names: set, crawled_base_urls: list) -> list:
+    """
+    Returns stored scraped rows that no longer appear in the crawl. Rows are only
+    considered vanished if they live under a base URL that was actually crawled
+    this time, so a listing that failed to download never wipes its movies.
+    """
+    crawled_prefixes = tuple(crawled_base_urls)
+    return [
+        name for name, stored in existing.items()
+        if name not in scraped_names and stored['url'].startswith(crawled_prefixes)
+    ]
+
+async def upsert_chunk_with_retry(items: list, retries: int = MAX_RETRIES) -> bool:
+    """Upserts one chunk of catalog rows, retrying with backoff. Returns False if every attempt failed."""
+    for attempt in range(retries):
+        if await db.add_movie_batch(items) is not None:
+            return True
+        logger.warning(f"Upsert of {len(items)} rows failed (attempt {attempt+1}/{retries}).")
+        if attempt < retries - 1:
+            await asyncio.sleep(1 * (2 ** attempt))
+    return False
+
+async def write_catalog_stream(item_queue: asyncio.Queue, existing: dict, summary: dict, progress=None) -> tuple[set, set, list]:
+    """
+    Writer stage of the refresh pipeline. Consumes (listing_index, item) pairs from
+    item_queue until it receives None, drops rows identical to what is stored, and
+    upserts the rest in chunks of DB_BATCH_SIZE. Each chunk is retried on its own.
+    When a name appears in several listings the one from the later listing wins,
+    as it always has. Returns (scraped_names, failed_listing_indexes, written_directories),
+    where written_directories is a list of the directory items that were written.
+    """
+    chosen = {}   # name -> index of the listing whose row wins
+    pending = {}  # name -> (listing_index, item) waiting for the next chunk
+    written = set()
+    written_directories = {}
+    failed_listings = set()
+
+    async def flush():
+        batch = list(pending.values())
+        pending.clear()
+        if await upsert_chunk_with_retry([item for _, item in batch]):
+            for _, item in batch:
+                name = item['original_name']
+                if name not in written:
+                    summary['updated' if name in existing else 'added'] += 1
+                    written.add(name)
+                if item['type'] == "directory":
+                    written_directories[name] = item
+        else:
+            summary['failed'] += len(batch)
+            failed_listings.update(index for index, _ in batch)
+        if progress:
+            try:
+                await progress(summary)
+            except Exception as e:
+                logger.warning(f"Refresh progress callback failed: {e}")
+
+    while True:
+        entry = await item_queue.get()
+        if entry is None:
+            break
+        index, item = entry
+        name = item['original_name']
+        if chosen.get(name, -1) > index:
+            continue
+        chosen[name] = index
+
+        stored = existing.get(name)
+        if stored is not None and catalog_row(stored) == catalog_row(item) and name not in written:
+            # Unchanged; also drop a superseded row that hasn't been written yet.
+            pending.pop(name, None)
+            continue
+
+        pending[name] = (index, item)
+        if len(pending) >= DB_BATCH_SIZE:
+            await flush()
+
+    if pending:
+        await flush()
+    return set(chosen), failed_listings, list(written_directories.values())
+
+async def scrape_and_update_db(full: bool = False, progress=None) -> dict:
+    """
+    Scrapes all base URLs and streams the difference into the database.
+    Listing parsers feed a bounded queue and a single writer upserts changed rows
+    in chunks, so memory stays flat and one failing chunk does not sink the rest.
+    Listings whose fingerprint did not change since the last refresh are skipped
+    unless 'full' is set. 'progress', if given, is awaited with the summary after
+    every chunk. Returns a summary dict with 'added', 'updated', 'removed',
+    'skipped' and 'failed' counts. Concurrent calls run one after another.
+    """
+    async with refresh_lock:
+        return await refresh_catalog(full, progress)
+
+async def refresh_catalog(full: bool, progress) -> dict:
     logger.info("Starting to scrape and update database...")
-    
-    # Clear previously scraped movies to ensure the database is fresh.
-    # This will not affect manually added movies.
-    await db.clear_scraped_movies()
-    
-    scraped_items = []
-    async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=REQUEST_TIMEOUT)) as session:
-        tasks = [fetch_and_parse_url(session, base_url, scraped_items) for base_url in BASE_URLS]
-        await asyncio.gather(*tasks)
-
-    if scraped_items:
-        unique_scraped_items = {item['original_name']: item for item in scraped_items}.values()
-        unique_scraped_items_list = list(unique_scraped_items)
-        
-        await db.add_movie_batch(unique_scraped_items_list)
-        logger.info(f"Database update complete. Total items from this scrape: {len(unique_scraped_items_list)}")
-    else:
-        logger.info("No items were scraped. Database not updated.")
+    summary = {"added": 0, "updated": 0, "removed": 0, "skipped": 0, "failed": 0}
+
+    # Read what is stored so only the delta is written; never clear the table,
+    # otherwise searches return nothing while the refresh is running.
+    existing = await db.get_scraped_movies_snapshot()
+    if existing is None:
+        logger.error("Could not read the current catalog. Aborting refresh to avoid destructive writes.")
+        return summary
+
+    crawl_state.load()
+    stored_urls = [row['url'] for row in existing.values()]
+
+    def stored_fingerprint(base_url: str) -> dict | None:
+        # A listing with no stored rows is always re-parsed, so a wiped table
+        # can never be "unchanged".
+        if full or not any(url.startswith(base_url) for url in stored_urls):
+            return None
+        return crawl_state.get(base_url)
+
+    listing_indexes = {base_url: i for i, base_url in enumerate(BASE_URLS)}
+    item_queue = asyncio.Queue(maxsize=REFRESH_QUEUE_SIZE)
+    writer = asyncio.create_task(write_catalog_stream(item_queue, existing, summary, progress))
+
+    session = http_clients.get("directory")
+    try:
+        async def visit(base_url: str) -> list:
+            items = []
+            status, fingerprint = await fetch_and_parse_url(session, base_url, items, stored_fingerprint(base_url))
+            for item in items:
+                await item_queue.put((listing_indexes[base_url], item))
+            return [(CRAWL_RESULT, (base_url, status, fingerprint))]
+
+        results = await crawl_scheduler.run(BASE_URLS, visit)
+    finally:
+        await item_queue.put(None)
+    scraped_names, failed_listings, written_directories = await writer
+
+    # A visit that raised yields no result, so outcomes are matched by URL and a
+    # listing without one counts as failed: its rows must never look vanished.
+    outcomes = {base_url: (LISTING_FAILED, None) for base_url in BASE_URLS}
+    outcomes.update({base_url: (status, fingerprint) for base_url, status, fingerprint in results})
+
+    crawled_base_urls = [base_url for base_url, (status, _) in outcomes.items() if status == LISTING_CHANGED]
+    summary["skipped"] = sum(1 for status, _ in outcomes.values() if status == LISTING_UNCHANGED)
+    if not crawled_base_urls:
+        logger.info(f"No changed listings ({summary['skipped']} unchanged). Database not updated.")
+        return summary
+
+    vanished_names = find_vanished_names(existing, scraped_names, crawled_base_urls)
+    await db.delete_movies_by_names(vanished_names)
+    summary["removed"] = len(vanished_names)
+
+    # Only remember fingerprints for listings whose rows were all stored, otherwise
+    # a failed write would make the listing look unchanged on the next refresh.
+    for base_url, (status, fingerprint) in outcomes.items():
+        if status == LISTING_CHANGED and listing_indexes[base_url] not in failed_listings:
+            crawl_state.set(base_url, fingerprint)
+    crawl_state.save()
+
+    # The index is kept current on every write; rebuilding also picks up rows
+    # changed outside the bot.
+    if summary["added"] or summary["updated"] or summary["removed"]:
+        await db.load_search_index()
+        await db.recompute_counts()
+        # The writer does not report which file items changed, so no rendered page is trusted.
+        rendered_messages.clear()
+
+    # Materialise file listings of new and changed directories so their first
+    # detail view is a single DB read instead of a live crawl.
+    if written_directories:
+        run_in_background(index_directory_items(written_directories))
+        for item_info in written_directories:
+            queue_link_prefetch("movie", item_info["original_name"])
+
+    logger.info(
+        f"Database update complete. Crawled {len(crawled_base_urls)}/{len(BASE_URLS)} listings "
+        f"({summary['skipped']} unchanged): {summary['added']} added, {summary['updated']} updated, "
+        f"{summary['removed']} removed, {summary['failed']} failed."
+    )
+    return summary
 
-async def fetch_and_parse_url(session: aiohttp.ClientSession, base_url: str, results_list: list):
-    content = await fetch_url(session, base_url)
-    if not content:
-        return
+async def fetch_and_parse_url(session: aiohttp.ClientSession, base_url: str, results_list: list, fingerprint: dict | None = None):
+    """
+    Parses one listing into results_list if it changed since 'fingerprint'.
+    Returns (status, new_fingerprint) as produced by fetch_listing.
+    """
+    status, content, new_fingerprint = await fetch_listing(session, base_url, fingerprint)
+    if status != LISTING_CHANGED:
+        return status, new_fingerprint
 
     category = get_category(base_url)
-    soup = BeautifulSoup(content, 'html.parser')
-    
-    for link in soup.find_all('a'):
-        href = link.get('href')
+    # Parse in a worker thread so big listings don't stall the bot's event loop.
+    links = await asyncio.to_thread(parse_listing_links, content)
+
+    for link in links:
+        href = link.href
         text = unquote(link.text.strip())
         
         if not href or href.startswith(('?', '#', 'javascript:', '../', 'mailto:')):
@@ -300,90 +614,239 @@ async def fetch_and_parse_url(session: aiohttp.ClientSession, base_url: str, res
             "category": category,
             "source": "scraped"
         })
+    return LISTING_CHANGED, new_fingerprint
+
+async def scrape_files_recursive(session: aiohttp.ClientSession, base_url: str, category: str) -> tuple[list, bool]:
+    """
+    Walks a directory tree for video files, returning (files, complete) where files are
+    (url, display_name, size, modified) tuples in listing order and complete is False
+    if any listing in the tree could not be fetched or parsed. Sizes and dates come from
+    the listing's own columns; a HEAD probe is only sent for files whose listing shows
+    no size. Subdirectories and probes fan out through the shared crawl scheduler.
+    """
+    failed = []
+
+    async def visit(url: str) -> list:
+        try:
+            return await visit_listing(url)
+        except Exception:
+            failed.append(url)
+            raise
+
+    async def visit_listing(url: str) -> list:
+        content = await fetch_url(session, url)
+        if not content:
+            failed.append(url)
+            return []
 
-async def scrape_files_recursive(session: aiohttp.ClientSession, base_url: str, category: str) -> list:
-    """Recursively scrapes a directory for video files."""
-    files_found = []
-    content = await fetch_url(session, base_url)
-    if not content:
-        return files_found
-
-    soup = BeautifulSoup(content, 'html.parser')
-    for link in soup.find_all('a'):
-        href = link.get('href')
-        text = unquote(link.text.strip())
-
-        if not href or href.startswith(('?', '#', 'javascript:', '../', 'mailto:')):
-            continue
+        entries = []
+        probe_urls = []
+        for link in await asyncio.to_thread(parse_listing_links, content):
+            href = link.href
+            text = unquote(link.text.strip())
 
-        full_url = urljoin(base_url, href)
-        
-        if href.endswith('/'):
-            if text != "Parent Directory":
-                files_found.extend(await scrape_files_recursive(session, full_url, category))
-        elif any(href.lower().endswith(ext) for ext in VIDEO_EXTENSIONS):
-            file_size = await get_file_size(session, full_url)
-            display_name = f"[{category}] {text}" if category else text
-            files_found.append((full_url, display_name, file_size))
-            
-    return files_found
+            if not href or href.startswith(('?', '#', 'javascript:', '../', 'mailto:')):
+                continue
 
-async def get_item_files(item_original_name: str) -> list:
-    item_info = await db.get_movie_details(item_original_name)
-    
-    if not item_info:
-        return []
+            full_url = urljoin(url, href)
 
+            if href.endswith('/'):
+                if text != "Parent Directory":
+                    entries.append((CRAWL_FOLLOW, full_url))
+            elif any(href.lower().endswith(ext) for ext in VIDEO_EXTENSIONS):
+                display_name = f"[{category}] {text}" if category else text
+                if link.size_bytes is not None:
+                    file_size = format_size(link.size_bytes)
+                else:
+                    file_size = None
+                    probe_urls.append(full_url)
+                entries.append((CRAWL_RESULT, (full_url, display_name, file_size, link.modified)))
+
+        if probe_urls:
+            probed_sizes = dict(zip(probe_urls, await asyncio.gather(*[get_file_size(session, u) for u in probe_urls])))
+            entries = [
+                (kind, (value[0], value[1], probed_sizes[value[0]], value[3]) if kind == CRAWL_RESULT and value[2] is None else value)
+                for kind, value in entries
+            ]
+        return entries
+
+    files = await crawl_scheduler.run([base_url], visit)
+    if failed:
+        logger.warning(f"{len(failed)} listings under {base_url} could not be crawled, e.g. {failed[0]}.")
+    return files, not failed
+
+async def crawl_item_files(item_info: dict) -> tuple[list, bool]:
+    """
+    Crawls an item's files live from the directory server. Returns (files, complete);
+    complete is False when part of a directory tree could not be crawled.
+    """
     try:
-        async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=REQUEST_TIMEOUT)) as session:
-            category = item_info.get("category", "")
-            if item_info["type"] == "directory":
-                return await scrape_files_recursive(session, item_info["url"], category)
-            elif item_info["type"] == "file":
-                file_size = await get_file_size(session, item_info["url"])
-                display_name = f"[{category}] {item_info['original_name']}" if category else item_info['original_name']
-                return [(item_info["url"], display_name, file_size)]
-            return []
+        session = http_clients.get("directory")
+        category = item_info.get("category", "")
+        if item_info["type"] == "directory":
+            return await scrape_files_recursive(session, item_info["url"], category)
+        elif item_info["type"] == "file":
+            file_size = await get_file_size(session, item_info["url"])
+            display_name = f"[{category}] {item_info['original_name']}" if category else item_info['original_name']
+            return [(item_info["url"], display_name, file_size, None)], True
+        return [], True
     except Exception as e:
         logger.error(f"File retrieval error: {str(e)}")
+        return [], False
+
+async def index_directory_item(item_info: dict) -> list:
+    """Crawls a directory item and stores its recursive file listing in the file index."""
+    return await inflight.run(("index", item_info["original_name"]), crawl_and_index_item, item_info)
+
+async def crawl_and_index_item(item_info: dict) -> list:
+    files, complete = await crawl_item_files(item_info)
+    # Storing a partial crawl would delete every indexed file it missed, so the
+    # previous index is kept unless the whole tree was read.
+    if files and complete:
+        await db.replace_files_for_movie(item_info["original_name"], files)
+    # Also keeps pages being built from a partial live crawl out of the rendered cache.
+    if files or not complete:
+        invalidate_rendered("movie", item_info["original_name"])
+    return files
+
+async def revalidate_item_files(item_info: dict):
+    """Re-indexes a directory item, joining a re-index of it that is already running."""
+    await index_directory_item(item_info)
+
+async def index_directory_items(items: list):
+    """Background indexer: materialises the file listings of many directory items."""
+    semaphore = asyncio.Semaphore(FILE_INDEX_CONCURRENCY)
+
+    async def index_one(item_info: dict):
+        async with semaphore:
+            await revalidate_item_files(item_info)
+
+    logger.info(f"Indexing files of {len(items)} directory items in the background...")
+    await asyncio.gather(*(index_one(item_info) for item_info in items))
+    logger.info("Background file indexing complete.")
+
+async def get_item_files(item_original_name: str, item_info: dict | None = None) -> list:
+    """
+    Returns (url, display_name, size, modified) tuples for an item. Directory items
+    are served from the file index and re-crawled in the background once the index
+    is older than FILE_INDEX_MAX_AGE; only never-indexed directories are crawled live.
+    """
+    return await inflight.run(("files", item_original_name), load_item_files, item_original_name, item_info)
+
+async def load_item_files(item_original_name: str, item_info: dict | None) -> list:
+    if item_info is None:
+        item_info = await db.get_movie_details(item_original_name)
+
+    if not item_info:
         return []
 
+    if item_info["type"] == "directory":
+        indexed = await db.get_files_for_movie(item_info["original_name"])
+        if indexed:
+            if time.time() - min(row["last_seen"] for row in indexed) > FILE_INDEX_MAX_AGE:
+                run_in_background(revalidate_item_files(item_info))
+            return [(row["url"], row["display_name"], row["size"], row["modified"]) for row in indexed]
+        return await index_directory_item(item_info)
+
+    files, _ = await crawl_item_files(item_info)
+    return files
+
 async def shorten_url(url_to_shorten: str) -> str:
     if not SHRINKME_API_KEY:
         return url_to_shorten
         
-    if url_to_shorten in url_shorten_cache:
-        return url_shorten_cache[url_to_shorten]
+    cached = short_urls.get(url_to_shorten)
+    if cached:
+        return cached
+    return await inflight.run(("shorten", url_to_shorten), request_short_url, url_to_shorten)
 
+async def request_short_url(url_to_shorten: str) -> str:
     try:
         api_url = "https://shrinkme.io/api"
         params = {"api": SHRINKME_API_KEY, "url": quote(url_to_shorten)}
         
-        async with aiohttp.ClientSession() as session:
-            async with session.get(api_url, params=params, timeout=REQUEST_TIMEOUT) as response:
-                data = await response.json()
-                if data.get("status") == "success":
-                    shortened = data["shortenedUrl"]
-                    url_shorten_cache[url_to_shorten] = shortened
-                    return shortened
+        async with http_clients.get("shrinkme").get(api_url, params=params) as response:
+            data = await response.json()
+            if data.get("status") == "success":
+                shortened = data["shortenedUrl"]
+                short_urls.put(url_to_shorten, shortened)
+                return shortened
         return url_to_shorten
     except Exception as e:
         logger.error(f"URL shortening failed: {str(e)}", exc_info=True)
         return url_to_shorten
 
+async def item_link_urls(item_type: str, item_name: str) -> list:
+    """Returns the download URLs an item's detail pages link to, in page order."""
+    if item_type == "webseries":
+        series_info = await db.get_webseries_details(item_name)
+        if not series_info:
+            return []
+        return [ep["url"] for ep in await db.get_episodes_for_series(series_info["id"])]
+
+    item_info = await db.get_movie_details(item_name)
+    if not item_info:
+        return []
+    if item_info.get('source', 'scraped') == 'manual':
+        return [url for url in item_info.get('url', '').split('\n') if url]
+    return [url for url, _, _, _ in await get_item_files(item_name, item_info)]
+
+def queue_link_prefetch(item_type: str, item_name: str):
+    """Asks the background job to shorten an item's links ahead of its first view."""
+    if SHRINKME_API_KEY and SHORTEN_PREFETCH_RATE:
+        shorten_prefetch_queue[(item_type, item_name)] = None
+        shorten_prefetch_wakeup.set()
+
+async def run_link_prefetch():
+    """
+    Background job that shortens the first SHORTEN_PREFETCH_LINKS links of queued
+    items and of the most selected ones, so detail pages find them in the store.
+    Links already stored cost nothing; new ones are shortened at a bounded rate.
+    """
+    while True:
+        try:
+            await asyncio.wait_for(shorten_prefetch_wakeup.wait(), timeout=SHORTEN_PREFETCH_INTERVAL)
+        except asyncio.TimeoutError:
+            # Popular items are only revisited on the timer, not on every queued item.
+            for item_name, _ in sorted(item_selection_counts.items(), key=lambda x: x[1], reverse=True)[:SHORTEN_PREFETCH_POPULAR]:
+                shorten_prefetch_queue.setdefault((selected_item_types.get(item_name, "movie"), item_name), None)
+        shorten_prefetch_wakeup.clear()
+
+        while shorten_prefetch_queue:
+            item_type, item_name = next(iter(shorten_prefetch_queue))
+            del shorten_prefetch_queue[(item_type, item_name)]
+            try:
+                urls = (await item_link_urls(item_type, item_name))[:SHORTEN_PREFETCH_LINKS]
+                stored = short_urls.get_many(urls)
+                for url in urls:
+                    if url not in stored:
+                        await shorten_url(url)
+                        await asyncio.sleep(1 / SHORTEN_PREFETCH_RATE)
+            except Exception as e:
+                logger.error(f"Error pre-shortening links of {item_type} '{item_name}': {e}", exc_info=True)
+
 async def get_movie_metadata(title: str) -> dict:
-    """Fetches movie metadata from OMDb, rotating API keys on rate limits."""
+    """
+    Fetches movie metadata from OMDb, using the healthiest key in the pool for each request.
+    A failure that may succeed on retry (keys exhausted, timeouts, network errors) is
+    marked with "Transient": True so callers don't keep its result around.
+    """
     if not OMDB_API_KEYS:
         return {"Response": "False", "Error": "OMDb API keys are not configured."}
 
-    if title in metadata_cache:
-        logger.debug(f"Returning cached metadata for title: {title}")
-        return metadata_cache[title]
-
     cleaned_title = re.sub(r'\s*\(\d{4}\).*', '', title).strip()
     year_match = re.search(r'\((\d{4})\)', title)
     year = year_match.group(1) if year_match else None
 
+    cache_key = metadata_key(cleaned_title, year)
+    cached = metadata_cache.get(cache_key)
+    if cached is not None:
+        found, data = cached
+        logger.debug(f"Returning cached metadata for title: {title}")
+        return data if found else {"Response": "False", "Error": "Movie not found after all attempts."}
+    return await inflight.run(("omdb", cache_key), fetch_movie_metadata, title, cleaned_title, year, cache_key)
+
+async def fetch_movie_metadata(title: str, cleaned_title: str, year: str | None, cache_key: str) -> dict:
     search_url = "http://www.omdbapi.com/"
     
     # List of parameter configurations to try in order
@@ -394,52 +857,69 @@ async def get_movie_metadata(title: str) -> dict:
     # Always have the title-only search as a primary or fallback option
     search_configs.append({"t": cleaned_title})
 
-    async with aiohttp.ClientSession() as session:
-        # Iterate through search configurations (e.g., with year, then without)
-        for params in search_configs:
-            # For each configuration, try all available API keys
-            for i, api_key in enumerate(OMDB_API_KEYS):
-                params["apikey"] = api_key
-                try:
-                    timeout = aiohttp.ClientTimeout(total=METADATA_REQUEST_TIMEOUT)
-                    logger.info(f"Searching OMDb with key #{i} and params: { {k:v for k,v in params.items() if k != 'apikey'} }")
-                    
-                    async with session.get(search_url, params=params, timeout=timeout) as response:
-                        data = await response.json()
-                    
-                    if data.get("Response") == "True":
-                        metadata_cache[title] = data
-                        return data
-                    
-                    # If rate limited, log and try the next key
-                    if "limit reached" in data.get("Error", "").lower():
-                        logger.warning(f"OMDb API key #{i} is rate-limited. Trying next key.")
-                        continue  # Go to the next API key
-                    
-                    # If any other error (e.g., "Movie not found"),
-                    # stop trying keys for this config and move to the next one.
-                    logger.warning(f"OMDb search failed for key #{i} with error: {data.get('Error')}. Trying next search config.")
-                    break # Breaks from the inner 'for api_key' loop
-
-                except asyncio.TimeoutError:
-                    logger.error(f"OMDb API request timed out for key #{i}.")
-                    # Don't rotate on timeout, could be a network issue. Treat as a failure for this config.
-                    break # Breaks from the inner 'for api_key' loop
-                except Exception as e:
-                    logger.error(f"OMDb API error for key #{i}: {str(e)}", exc_info=True)
-                    # Treat as a failure for this config
-                    break # Breaks from the inner 'for api_key' loop
-        
-        # If all search configurations and keys fail
-        logger.error(f"All OMDb search attempts failed for title '{title}'.")
+    # Only a lookup OMDb answered for every configuration is cached as "not found";
+    # rate limits, timeouts and network errors are retried on the next request.
+    definitive_miss = True
+    session = http_clients.get("omdb")
+    # Iterate through search configurations (e.g., with year, then without)
+    for params in search_configs:
+        # Each rate-limited key is cooled down, so this ends once the pool is exhausted.
+        while True:
+            i = omdb_keys.acquire()
+            if i is None:
+                logger.warning("All OMDb API keys are exhausted or cooling down; skipping lookup.")
+                definitive_miss = False
+                break
+            params["apikey"] = OMDB_API_KEYS[i]
+            try:
+                logger.info(f"Searching OMDb with key #{i} and params: { {k:v for k,v in params.items() if k != 'apikey'} }")
+                
+                async with session.get(search_url, params=params) as response:
+                    data = await response.json()
+            except asyncio.TimeoutError:
+                logger.error(f"OMDb API request timed out for key #{i}.")
+                omdb_keys.record_error(i)
+                definitive_miss = False
+                # Don't rotate on timeout, could be a network issue. Treat as a failure for this config.
+                break
+            except Exception as e:
+                logger.error(f"OMDb API error for key #{i}: {str(e)}", exc_info=True)
+                omdb_keys.record_error(i)
+                definitive_miss = False
+                # Treat as a failure for this config
+                break
+
+            if data.get("Response") == "True":
+                omdb_keys.record_success(i)
+                metadata_cache.put(cache_key, data)
+                return data
+
+            # If rate limited (or the key was revoked), cool the key down and try the next one
+            error = data.get("Error", "").lower()
+            if "limit reached" in error or "invalid api key" in error:
+                logger.warning(f"OMDb API key #{i} is unusable ({data.get('Error')}). Trying next key.")
+                omdb_keys.record_rate_limited(i)
+                continue
+
+            # Any other error (e.g., "Movie not found") is a valid answer from a healthy key;
+            # move on to the next search configuration.
+            omdb_keys.record_success(i)
+            logger.warning(f"OMDb search failed for key #{i} with error: {data.get('Error')}. Trying next search config.")
+            break
+    
+    # If all search configurations and keys fail
+    logger.error(f"All OMDb search attempts failed for title '{title}'.")
+    if definitive_miss:
+        metadata_cache.put(cache_key, None)
         return {"Response": "False", "Error": "Movie not found after all attempts."}
+    return {"Response": "False", "Error": "Movie not found after all attempts.", "Transient": True}
 
 
 # --- Telegram Handlers ---
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     try:
         user = update.effective_user
-        await db.add_user(user.id)
+        user_registry.note(user.id)
         user_name = user.first_name
         welcome_message = f"🎬 Welcome {user_name} to Movie Finder Bot!\n\n"
         
@@ -460,12 +940,13 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
 👑 <b>Admin Commands:</b> 👑
 /stats - View bot statistics.
 /popular - See top 10 popular items.
-/refreshdb - Refresh the movie database.
+/refreshdb [full] - Refresh the movie database (<i>full</i> re-crawls unchanged listings).
 /url &lt;category&gt; | &lt;movie_name&gt; | &lt;link1&gt; | &lt;link2&gt;... - Add a movie manually.
   <i>Example:</i> <code>/url Bollywood | My Movie | https://link1.com</code>
 /addwebseries &lt;name&gt; | &lt;category&gt; | &lt;poster_url&gt; | &lt;plot&gt; | &lt;S1E1:url1;S1E2:url2&gt; - Add a web series.
   <i>Example:</i> <code>/addwebseries My Series | Webseries | http://poster.url/img.jpg | A great series | S1E1:http://link1.com</code>
-/viewrequests - View movie requests.
+  Or upload a .txt/.csv file of episodes (<code>S1E1:url</code> or <code>S1E1,url,name</code> per line) captioned <code>/addwebseries &lt;name&gt; | &lt;category&gt; | &lt;poster_url&gt; | &lt;plot&gt;</code>.
+/viewrequests [rebuild] - View the most requested titles (<i>rebuild</i> recounts the whole request log).
 /broadcast &lt;message&gt; - Send a message to all users.
 """
             full_message += admin_commands_message
@@ -494,12 +975,13 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 👑 <b>Admin Commands:</b> 👑
 /stats - View bot statistics.
 /popular - See top 10 popular items.
-/refreshdb - Refresh the movie database.
+/refreshdb [full] - Refresh the movie database (<i>full</i> re-crawls unchanged listings).
 /url &lt;category&gt; | &lt;movie_name&gt; | &lt;link1&gt; | &lt;link2&gt;... - Add a movie manually.
   <i>Example:</i> <code>/url Bollywood | My Movie | https://link1.com</code>
 /addwebseries &lt;name&gt; | &lt;category&gt; | &lt;poster_url&gt; | &lt;plot&gt; | &lt;S1E1:url1;S1E2:url2&gt; - Add a web series.
   <i>Example:</i> <code>/addwebseries My Series | Webseries | http://poster.url/img.jpg | A great series | S1E1:http://link1.com</code>
-/viewrequests - View movie requests.
+  Or upload a .txt/.csv file of episodes (<code>S1E1:url</code> or <code>S1E1,url,name</code> per line) captioned <code>/addwebseries &lt;name&gt; | &lt;category&gt; | &lt;poster_url&gt; | &lt;plot&gt;</code>.
+/viewrequests [rebuild] - View the most requested titles (<i>rebuild</i> recounts the whole request log).
 /broadcast &lt;message&gt; - Send a message to all users.
 """
         
@@ -530,7 +1012,7 @@ def get_relevancy_score(name, query):
 
 async def handle_search(update: Update, context: ContextTypes.DEFAULT_TYPE):
     try:
-        await db.add_user(update.effective_user.id)
+        user_registry.note(update.effective_user.id)
         if not context.args:
             await update.message.reply_text("❌ Please specify a movie or web series name.", parse_mode='HTML')
             return
@@ -542,26 +1024,19 @@ async def handle_search(update: Update, context: ContextTypes.DEFAULT_TYPE):
         
         processing_msg = await update.message.reply_text(f"⏳ Searching for '<b>{query}</b>'...", parse_mode='HTML')
         
-        matched_names = await search_movie(query)
-        if not matched_names:
+        matches = await search_movie(query)
+        if not matches:
             await processing_msg.edit_text(f"😞 No results for '<b>{query}</b>'. You can request it using /request.", parse_mode='HTML')
             return
             
         # Sort results by relevancy
-        sorted_matched_names = sorted(matched_names, key=lambda name: get_relevancy_score(name, norm_query), reverse=True)
+        sorted_matches = sorted(matches, key=lambda match: get_relevancy_score(match["name"], norm_query), reverse=True)
 
         keyboard = []
-        for name in sorted_matched_names[:FILES_PER_PAGE]:
-            item_info = await db.get_movie_details(name)
-            item_type = "movie"
-            if not item_info:
-                item_info = await db.get_webseries_details(name)
-                item_type = "webseries"
-
-            if item_info:
-                category = item_info.get("category", "N/A")
-                display_text = f"[{category}] {name}" if category else name
-                keyboard.append([InlineKeyboardButton(display_text, callback_data=f"select_{item_type}_{name}")])
+        for match in sorted_matches[:FILES_PER_PAGE]:
+            name, item_type, category = match["name"], match["type"], match["category"]
+            display_text = f"[{category}] {name}" if category else name
+            keyboard.append([InlineKeyboardButton(display_text, callback_data=f"select_{item_type}_{name}")])
 
         await processing_msg.edit_text(
             f"🎬 Results for '<b>{query}</b>':",
@@ -575,7 +1050,7 @@ async def handle_search(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def handle_get(update: Update, context: ContextTypes.DEFAULT_TYPE):
     try:
-        await db.add_user(update.effective_user.id)
+        user_registry.note(update.effective_user.id)
         if not context.args:
             await update.message.reply_text("❌ Please specify a movie or web series name.", parse_mode='HTML')
             return
@@ -586,26 +1061,16 @@ async def handle_get(update: Update, context: ContextTypes.DEFAULT_TYPE):
         
         processing_msg = await update.message.reply_text(f"⏳ Direct search for '<b>{query}</b>'...", parse_mode='HTML')
         
-        matched_names = await search_movie(query)
-        if not matched_names:
+        matches = await search_movie(query)
+        if not matches:
             await processing_msg.edit_text(f"😞 No matches for '<b>{query}</b>'.", parse_mode='HTML')
             return
 
-        # Sort results by relevancy and pick the best one
-        sorted_matched_names = sorted(matched_names, key=lambda name: get_relevancy_score(name, norm_query), reverse=True)
-        best_match = sorted_matched_names[0]
-        
-        item_info = await db.get_movie_details(best_match)
-        item_type = "movie"
-        if not item_info:
-            item_info = await db.get_webseries_details(best_match)
-            item_type = "webseries"
-
-        if item_info:
-            await processing_msg.delete()
-            await send_item_details(context, update.message.chat_id, best_match, item_type=item_type)
-        else:
-            await processing_msg.edit_text(f"😞 No details found for '<b>{best_match}</b>'.", parse_mode='HTML')
+        # Pick the most relevant match; send_item_details loads its full details.
+        best_match = max(matches, key=lambda match: get_relevancy_score(match["name"], norm_query))
+
+        await processing_msg.delete()
+        await send_item_details(context, update.message.chat_id, best_match["name"], item_type=best_match["type"])
         
     except Exception as e:
         logger.error(f"Direct search error: {str(e)}", exc_info=True)
@@ -616,7 +1081,7 @@ async def handle_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await query.answer()
     
     try:
-        await db.add_user(update.effective_user.id)
+        user_registry.note(update.effective_user.id)
         data = query.data
         chat_id = query.message.chat_id
         message_id = query.message.message_id
@@ -627,6 +1092,7 @@ async def handle_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
             item_name = parts[2] 
 
             item_selection_counts[item_name] = item_selection_counts.get(item_name, 0) + 1
+            selected_item_types[item_name] = item_type
             await context.bot.edit_message_text(
                 chat_id=chat_id,
                 message_id=message_id,
@@ -667,19 +1133,14 @@ async def handle_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 logger.error(f"Error parsing page callback data '{data}': {e}")
                 await context.bot.send_message(chat_id, "⚠️ Error processing your request.")
         
-        elif data.startswith("browse_category_"):
-            # Correctly handle category names with underscores
+        elif data.startswith("bc:") or data.startswith("browse_category_"):
             try:
-                # Find the last underscore, which separates the page number
-                last_underscore_index = data.rfind('_')
-                if last_underscore_index == -1:
-                    raise ValueError("Invalid callback data format")
-
-                # Extract category and page number
-                category = data[len("browse_category_"):last_underscore_index]
-                page_part = data[last_underscore_index + 1:]
-                
-                page = int(page_part)
+                if data.startswith("bc:"):
+                    category, page, direction, cursor_type, cursor_id = parse_browse_callback(data)
+                else:
+                    # Buttons from /browse menus sent before keyset paging always open the first page.
+                    category = data[len("browse_category_"):data.rfind('_')]
+                    page, direction, cursor_type, cursor_id = 0, "next", None, None
 
                 await context.bot.edit_message_text(
                     chat_id=chat_id,
@@ -687,9 +1148,9 @@ async def handle_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
                     text=f"⏳ Loading {category} movies (page {page+1})...",
                     parse_mode='HTML'
                 )
-                await send_category_movies(context, chat_id, category, page=page)
-            except (ValueError, IndexError) as e:
-                logger.error(f"Error parsing browse_category callback data '{data}': {e}")
+                await send_category_movies(context, chat_id, category, page, direction, cursor_type, cursor_id)
+            except (ValueError, IndexError, StopIteration) as e:
+                logger.error(f"Error parsing browse callback data '{data}': {e}")
                 await context.bot.send_message(chat_id, "⚠️ Error processing your request.")
             
     except Exception as e:
@@ -704,10 +1165,27 @@ async def send_item_details(context: CallbackContext, chat_id: int, item_name: s
         return
         
     try:
+        # --- Reuse a page that was already rendered ---
+        render_key = (item_type, item_name, page)
+        message_id = rendered_messages.get(render_key, None)
+        if message_id is not None:
+            try:
+                await context.bot.forward_message(chat_id=chat_id, from_chat_id=LOG_CHANNEL_ID, message_id=message_id)
+                return
+            except BadRequest as e:
+                # Usually the log-channel message was deleted; render the page again.
+                logger.warning(f"Could not forward rendered message {message_id} for '{item_name}': {e}")
+                rendered_messages.invalidate(render_key)
+        # Any invalidation while the page is being built keeps it out of the cache.
+        render_version = rendered_messages.version
+
         # --- Build the message content ---
         caption = ""
         reply_markup = None
         poster_url = ""
+        # Pages with a link the shortener failed on, or built while OMDb was unreachable, are not reused.
+        fully_shortened = True
+        metadata_final = True
 
         if item_type == "movie":
             item_info = await db.get_movie_details(item_name)
@@ -716,6 +1194,7 @@ async def send_item_details(context: CallbackContext, chat_id: int, item_name: s
                 return
 
             metadata = await get_movie_metadata(item_name)
+            metadata_final = not metadata.get("Transient")
             files = []
 
             source = item_info.get('source', 'scraped')
@@ -725,12 +1204,12 @@ async def send_item_details(context: CallbackContext, chat_id: int, item_name: s
                      await context.bot.send_message(chat_id, "🚫 No download links found for this manually added movie.")
                      return
                 
-                async with aiohttp.ClientSession() as session:
-                    file_sizes = await asyncio.gather(*[get_file_size(session, u) for u in urls])
+                session = http_clients.get("directory")
+                file_sizes = await asyncio.gather(*[get_file_size(session, u) for u in urls])
                 
-                files = [(url, f"{item_name} - Link {i+1}", size) for i, (url, size) in enumerate(zip(urls, file_sizes))]
+                files = [(url, f"{item_name} - Link {i+1}", size, None) for i, (url, size) in enumerate(zip(urls, file_sizes))]
             else:
-                files = await get_item_files(item_name)
+                files = await get_item_files(item_name, item_info)
 
             if not files:
                 await context.bot.send_message(chat_id, f"🚫 No download links could be found for <b>{item_name}</b>. You can request it using <code>/request {item_name}</code>", parse_mode='HTML')
@@ -745,10 +1224,14 @@ async def send_item_details(context: CallbackContext, chat_id: int, item_name: s
             start_idx = page * FILES_PER_PAGE
             paginated_files = files[start_idx:start_idx+FILES_PER_PAGE]
             
-            shorten_tasks = [shorten_url(url) for url, _, _ in paginated_files]
+            shorten_urls = [url for url, _, _, _ in paginated_files]
+            shorten_tasks = [shorten_url(url) for url in shorten_urls]
             shortened_urls = await asyncio.gather(*shorten_tasks)
+            fully_shortened = not SHRINKME_API_KEY or all(
+                short_url != long_url for short_url, long_url in zip(shortened_urls, shorten_urls)
+            )
             
-            for (url, name, size), short_url in zip(paginated_files, shortened_urls):
+            for (url, name, size, _), short_url in zip(paginated_files, shortened_urls):
                 keyboard.append([InlineKeyboardButton(f"📥 {name[:35]} ({size})", url=short_url)])
 
             if len(files) > FILES_PER_PAGE:
@@ -783,8 +1266,12 @@ async def send_item_details(context: CallbackContext, chat_id: int, item_name: s
             start_idx = page * FILES_PER_PAGE
             paginated_episodes = episodes[start_idx:start_idx+FILES_PER_PAGE]
 
-            shorten_tasks = [shorten_url(ep["url"]) for ep in paginated_episodes]
+            shorten_urls = [ep["url"] for ep in paginated_episodes]
+            shorten_tasks = [shorten_url(url) for url in shorten_urls]
             shortened_urls = await asyncio.gather(*shorten_tasks)
+            fully_shortened = not SHRINKME_API_KEY or all(
+                short_url != long_url for short_url, long_url in zip(shortened_urls, shorten_urls)
+            )
 
             for (ep, short_url) in zip(paginated_episodes, shortened_urls):
                 ep_display_name = ep.get("name") or f"{series_info['name']} S{ep['season']}E{ep['episode']}"
@@ -831,6 +1318,8 @@ async def send_item_details(context: CallbackContext, chat_id: int, item_name: s
                 from_chat_id=LOG_CHANNEL_ID,
                 message_id=sent_message.message_id
             )
+            if fully_shortened and metadata_final:
+                rendered_messages.set(render_key, sent_message.message_id, version=render_version)
 
         except BadRequest as e:
             logger.error(f"Message sending/forwarding error (BadRequest): {str(e)}. Sending text only as fallback.")
@@ -848,39 +1337,57 @@ async def send_item_details(context: CallbackContext, chat_id: int, item_name: s
         logger.error(f"Details error: {str(e)}", exc_info=True)
         await context.bot.send_message(chat_id, "⚠️ Error processing request.")
 
-async def send_category_movies(context: CallbackContext, chat_id: int, category: str, page: int = 0):
+def browse_callback(category: str, page: int, direction: str = "", item: dict | None = None) -> str:
+    """
+    Encodes a browse page as 'bc:<page>:<cursor>:<category>'. The cursor is the
+    direction ('n' after / 'p' before), the item type ('m'/'w') and the item id, so
+    it stays short whatever the item's name; the category goes last so it may
+    contain any character.
+    """
+    cursor = f"{direction}{BROWSE_TYPE_CODES[item['type']]}{item['id']}" if item else ""
+    return f"bc:{page}:{cursor}:{category}"
+
+def parse_browse_callback(data: str) -> tuple:
+    """Inverse of browse_callback: returns (category, page, direction, cursor_type, cursor_id)."""
+    _, page, cursor, category = data.split(':', 3)
+    if not cursor:
+        return category, int(page), "next", None, None
+    direction = "prev" if cursor[0] == "p" else "next"
+    cursor_type = next(item_type for item_type, code in BROWSE_TYPE_CODES.items() if code == cursor[1])
+    return category, int(page), direction, cursor_type, int(cursor[2:])
+
+async def send_category_movies(context: CallbackContext, chat_id: int, category: str, page: int = 0,
+                               direction: str = "next", cursor_type: str | None = None, cursor_id: int | None = None):
     try:
-        offset = page * FILES_PER_PAGE
-        movie_names = await db.get_movies_by_category(category, offset, FILES_PER_PAGE)
-        webseries_names = await db.get_webseries_by_category(category, offset, FILES_PER_PAGE)
-        
-        all_items = []
-        for name in movie_names:
-            all_items.append((name, "movie"))
-        for name in webseries_names:
-            all_items.append((name, "webseries"))
-
-        all_items.sort(key=lambda x: x[0])
-
-        total_movies = await db.count_movies_in_category(category)
-        total_webseries = await db.count_webseries_in_category(category)
-        total_items = total_movies + total_webseries
-
-        if not all_items:
+        result = await db.browse_category_page(category, direction, cursor_type, cursor_id, FILES_PER_PAGE)
+        if result is None and cursor_id is not None:
+            # The item the page was anchored to is gone; start over.
+            page, direction = 0, "next"
+            result = await db.browse_category_page(category, direction, None, None, FILES_PER_PAGE)
+        items = result["items"] if result else []
+
+        if not items:
             await context.bot.send_message(chat_id, f"No items found in the <b>{category}</b> category.", parse_mode='HTML')
             return
 
+        if direction == "prev":
+            has_previous, has_next = result["has_more"], True
+        else:
+            has_previous, has_next = page > 0, result["has_more"]
+
         keyboard = []
-        for name, item_type in all_items:
-            keyboard.append([InlineKeyboardButton(name, callback_data=f"select_{item_type}_{name}")])
+        for item in items:
+            keyboard.append([InlineKeyboardButton(item["name"], callback_data=f"select_{item['type']}_{item['name']}")])
 
-        if total_items > FILES_PER_PAGE:
+        if has_previous or has_next:
+            total_items = await db.count_catalog_in_category(category)
+            total_pages = max(page + 1, (total_items + FILES_PER_PAGE - 1) // FILES_PER_PAGE)
             nav_buttons = []
-            if page > 0:
-                nav_buttons.append(InlineKeyboardButton("⬅️ Previous", callback_data=f"browse_category_{category}_{page-1}"))
-            nav_buttons.append(InlineKeyboardButton(f"📄 {page+1}/{(total_items + FILES_PER_PAGE - 1) // FILES_PER_PAGE}", callback_data="ignore"))
-            if offset + len(all_items) < total_items:
-                nav_buttons.append(InlineKeyboardButton("Next ➡️", callback_data=f"browse_category_{category}_{page+1}"))
+            if has_previous:
+                nav_buttons.append(InlineKeyboardButton("⬅️ Previous", callback_data=browse_callback(category, page - 1, "p", items[0])))
+            nav_buttons.append(InlineKeyboardButton(f"📄 {page+1}/{total_pages}", callback_data="ignore"))
+            if has_next:
+                nav_buttons.append(InlineKeyboardButton("Next ➡️", callback_data=browse_callback(category, page + 1, "n", items[-1])))
             keyboard.append(nav_buttons)
 
         reply_markup = InlineKeyboardMarkup(keyboard)
@@ -891,6 +1398,11 @@ async def send_category_movies(context: CallbackContext, chat_id: int, category:
             parse_mode='HTML'
         )
 
+        if has_next:
+            # Warm the cache so "Next" is served without a database round-trip.
+            last = items[-1]
+            run_in_background(db.browse_category_page(category, "next", last["type"], last["id"], FILES_PER_PAGE))
+
     except Exception as e:
         logger.error(f"Error in send_category_movies: {e}", exc_info=True)
         await context.bot.send_message(chat_id, "⚠️ An error occurred while fetching category movies.")
@@ -900,16 +1412,49 @@ async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not is_admin(update.effective_user.id):
         return
 
-    total_movies = await db.get_movie_count()
-    total_webseries = await db.count_webseries()
+    total_movies = await db.get_movie_count(estimated=True)
+    total_webseries = await db.count_webseries(estimated=True)
+    cache_stats = db.read_cache.stats()
+    metadata_stats = metadata_cache.stats()
+    rendered_stats = rendered_messages.stats()
     stats_text = (
         f"📊 <b>Bot Statistics</b> 📊\n\n"
         f"🎬 Total indexed movies: <b>{total_movies}</b>\n"
         f"📺 Total indexed web series: <b>{total_webseries}</b>\n"
         f"📈 Total searches performed: <b>{sum(search_query_counts.values())}</b>\n"
         f"🔍 Unique search queries: <b>{len(search_query_counts)}</b>\n"
-        f"✅ Total items selected: <b>{sum(item_selection_counts.values())}</b>"
+        f"✅ Total items selected: <b>{sum(item_selection_counts.values())}</b>\n"
+        f"🗃️ Read cache: <b>{cache_stats['hits']}</b> hits / <b>{cache_stats['misses']}</b> misses "
+        f"({cache_stats['hit_rate']:.0%}), {cache_stats['size']}/{cache_stats['maxsize']} entries\n"
+        f"🎞️ Metadata cache: <b>{metadata_stats['found']}</b> found / <b>{metadata_stats['not_found']}</b> not found "
+        f"(max {metadata_stats['max_entries']})\n"
+        f"🔗 Shortened links stored: <b>{len(short_urls)}</b> (max {short_urls.max_entries}), "
+        f"{len(shorten_prefetch_queue)} items queued for pre-shortening\n"
+        f"📨 Rendered pages: <b>{rendered_stats['hits']}</b> reused / <b>{rendered_stats['misses']}</b> built "
+        f"({rendered_stats['hit_rate']:.0%}), {rendered_stats['size']}/{rendered_stats['maxsize']} cached"
+    )
+    coalesced = ", ".join(
+        f"{kind} {counts['coalesced']}/{counts['started'] + counts['coalesced']}"
+        for kind, counts in inflight.stats().items()
     )
+    if coalesced:
+        stats_text += f"\n🛬 Coalesced upstream calls: {coalesced}"
+    for name, pool in http_clients.stats().items():
+        stats_text += (
+            f"\n🌐 HTTP {name}: <b>{pool['requests']}</b> requests, {pool['connections_created']} new / "
+            f"{pool['connections_reused']} reused connections (limit {pool['limit']}), {pool['errors']} errors"
+        )
+    for key in omdb_keys.health():
+        if key["available"]:
+            state = "✅ available"
+        elif key["cooldown_remaining"]:
+            state = f"⏳ cooling down ({int(key['cooldown_remaining'] // 60)}m left)"
+        else:
+            state = "⛔ daily limit reached"
+        stats_text += (
+            f"\n🔑 OMDb key #{key['index']}: {state}, <b>{key['used_today']}</b>/{OMDB_DAILY_LIMIT} today, "
+            f"{key['error_rate']:.0%} errors"
+        )
     await update.message.reply_text(stats_text, parse_mode='HTML')
 
 async def popular_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -930,11 +1475,34 @@ async def refresh_db_command(update: Update, context: ContextTypes.DEFAULT_TYPE)
     if not is_admin(update.effective_user.id):
         return
     
+    if refresh_lock.locked():
+        await update.message.reply_text("⏳ A database refresh is already running. Please wait for it to finish.")
+        return
+
+    full = bool(context.args) and context.args[0].lower() == "full"
     msg = await update.message.reply_text("🔄 Refreshing database from sources... This may take a while.")
     start_time = time.time()
-    await scrape_and_update_db()
+    last_progress = start_time
+
+    async def report_progress(summary: dict):
+        nonlocal last_progress
+        if time.time() - last_progress < REFRESH_PROGRESS_INTERVAL:
+            return
+        last_progress = time.time()
+        await msg.edit_text(
+            f"🔄 Refreshing database... {time.time()-start_time:.0f}s\n"
+            f"➕ {summary['added']} added | ✏️ {summary['updated']} updated so far"
+        )
+
+    summary = await scrape_and_update_db(full=full, progress=report_progress)
     total_movies = await db.get_movie_count()
-    await msg.edit_text(f"✅ Database refreshed in {time.time()-start_time:.2f}s. Total movies: {total_movies}")
+    result_text = (
+        f"✅ Database refreshed in {time.time()-start_time:.2f}s. Total movies: {total_movies}\n"
+        f"➕ {summary['added']} added | ✏️ {summary['updated']} updated | ➖ {summary['removed']} removed | ⏭️ {summary['skipped']} listings unchanged"
+    )
+    if summary['failed']:
+        result_text += f"\n⚠️ {summary['failed']} rows could not be written and will be retried next refresh."
+    await msg.edit_text(result_text)
 
 async def handle_add_url(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not is_admin(update.effective_user.id):
@@ -965,77 +1533,165 @@ async def handle_add_url(update: Update, context: ContextTypes.DEFAULT_TYPE):
         url_string = "\n".join(urls)
 
         await db.add_single_movie(name, url_string, 'file', normalized_name, category, source='manual')
+        queue_link_prefetch("movie", name)
         await update.message.reply_text(f"✅ Successfully added '<b>{name}</b>' with {len(urls)} link(s) to the <b>{category}</b> category.", parse_mode='HTML')
 
     except Exception as e:
         logger.error(f"Error in handle_add_url: {e}", exc_info=True)
         await update.message.reply_text("⚠️ An error occurred while adding the URL.")
 
-async def handle_add_webseries(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    if not is_admin(update.effective_user.id):
-        return
-
-    try:
-        full_text = " ".join(context.args)
-        parts = full_text.split('|')
-
+def parse_episode_entries(text: str, inline: bool = False) -> list:
+    """
+    Parses an episode list into (entry, episode, error) tuples, one per entry.
+    Entries are 'S1E1:url' lines, or CSV lines 'S1E1,url[,episode name]' as
+    exported from a spreadsheet. A first CSV line without a URL is taken as a
+    header and skipped. 'inline' lists, typed into the command, may also separate
+    entries with ';'; uploaded files are split on line breaks only, so URLs and
+    names in them can contain ';'.
+    """
+    if inline:
+        text = text.replace(';', '\n')
+    lines = [line.strip() for line in text.splitlines()]
+    lines = [line for line in lines if line]
+    if lines and 'http' not in lines[0].lower() and ',' in lines[0]:
+        lines = lines[1:]
+
+    parsed = []
+    for line in lines:
+        if EPISODE_COLON_ENTRY_RE.match(line) or ',' not in line:
+            fields = [field.strip() for field in line.split(':', 1)]
+        else:
+            fields = [field.strip() for field in next(csv.reader([line]))]
+        if len(fields) < 2:
+            parsed.append((line, None, "expected <SxEy>:<url>"))
+            continue
+        match = EPISODE_ID_RE.match(fields[0])
+        if not match:
+            parsed.append((line, None, f"invalid episode identifier '{fields[0]}'"))
+            continue
+        episode = {
+            "season": int(match.group(1)),
+            "episode": int(match.group(2)),
+            "url": fields[1],
+            "name": fields[2] if len(fields) > 2 and fields[2] else None,
+        }
+        parsed.append((line, episode, None))
+    return parsed
+
+async def add_webseries_with_episodes(update: Update, header_text: str, episodes_text: str | None):
+    """
+    Creates a web series from '<name> | <category> | <poster_url> | <plot>' and stores
+    its episodes in one bulk write, then reports which entries were skipped. If the
+    series already exists, the episodes are added to it.
+    """
+    parts = [p.strip() for p in header_text.split('|')]
+    inline = episodes_text is None
+    if inline:
         if len(parts) < 5:
             await update.message.reply_text("❌ Invalid format. Use: /addwebseries <name> | <category> | <poster_url> | <plot> | <S1E1:url1;S1E2:url2;...>")
             return
+        episodes_text = '|'.join(parts[4:])
+    if len(parts) < 4:
+        await update.message.reply_text("❌ Invalid format. Caption the file with: /addwebseries <name> | <category> | <poster_url> | <plot>")
+        return
 
-        series_name, category, poster_url, plot, episodes_data_str = [p.strip() for p in parts]
-
-        if not all([series_name, category, poster_url, plot, episodes_data_str]):
-            await update.message.reply_text("❌ All fields are required.")
-            return
-
-        if not poster_url.startswith(('http://', 'https://')):
-            await update.message.reply_text("❌ Invalid Poster URL.")
-            return
+    series_name, category, poster_url, plot = parts[:4]
+    if not all([series_name, category, poster_url, plot, episodes_text.strip()]):
+        await update.message.reply_text("❌ All fields are required.")
+        return
 
-        normalized_series_name = normalize_movie_name(series_name)
+    if not poster_url.startswith(('http://', 'https://')):
+        await update.message.reply_text("❌ Invalid Poster URL.")
+        return
 
-        if await db.get_webseries_details(series_name):
-            await update.message.reply_text(f"⚠️ Web series '<b>{series_name}</b>' already exists.", parse_mode='HTML')
-            return
+    parsed = parse_episode_entries(episodes_text, inline=inline)
+    if not any(episode for _, episode, _ in parsed):
+        await update.message.reply_text("❌ No valid episode entries found.")
+        return
 
-        series_id = await db.add_webseries(series_name, category, poster_url, plot, normalized_series_name)
+    existing = await db.get_webseries_details(series_name)
+    if existing:
+        series_id = existing["id"]
+    else:
+        series_id = await db.add_webseries(series_name, category, poster_url, plot, normalize_movie_name(series_name))
         if series_id is None:
             await update.message.reply_text("⚠️ Could not create web series in the database.")
             return
 
-        episodes_list = episodes_data_str.split(';')
-        for episode_entry in episodes_list:
-            if ':' not in episode_entry:
-                logger.warning(f"Skipping invalid episode format: {episode_entry}")
-                continue
-            
-            ep_info, ep_url = [item.strip() for item in episode_entry.split(':', 1)]
-            match = re.match(r'S(\d+)E(\d+)', ep_info, re.IGNORECASE)
-            if not match:
-                logger.warning(f"Skipping invalid episode identifier: {ep_info}")
-                continue
-            
-            season_num, episode_num = int(match.group(1)), int(match.group(2))
-            default_episode_name = f"{series_name} S{season_num}E{episode_num}"
-            await db.add_episode(series_id, season_num, episode_num, ep_url, episode_name=default_episode_name)
-        
-        await update.message.reply_text(f"✅ Successfully added web series '<b>{series_name}</b>' with {len(episodes_list)} episodes.", parse_mode='HTML')
+    episodes = []
+    for _, episode, _ in parsed:
+        if episode:
+            if not episode["name"]:
+                episode["name"] = f"{series_name} S{episode['season']}E{episode['episode']}"
+            episodes.append(episode)
+    results = iter(await db.add_episodes(series_id, episodes))
+
+    skipped = []
+    for entry, episode, error in parsed:
+        if episode:
+            error = next(results)
+        if error:
+            logger.warning(f"Skipping episode entry '{entry}': {error}")
+            skipped.append((entry, error))
+
+    stored_count = len(parsed) - len(skipped)
+    if stored_count:
+        invalidate_rendered("webseries", series_name)
+        queue_link_prefetch("webseries", series_name)
+    action = "Added episodes to existing" if existing else "Successfully added"
+    message = f"✅ {action} web series '<b>{html.escape(series_name)}</b>': {stored_count} episodes stored"
+    if skipped:
+        message += f", {len(skipped)} skipped:\n" + "\n".join(
+            f"• <code>{html.escape(entry[:60])}</code>: {html.escape(error)}"
+            for entry, error in skipped[:MAX_REPORTED_EPISODE_ERRORS]
+        )
+        if len(skipped) > MAX_REPORTED_EPISODE_ERRORS:
+            message += f"\n… and {len(skipped) - MAX_REPORTED_EPISODE_ERRORS} more (see logs)."
+    else:
+        message += "."
+    await update.message.reply_text(message, parse_mode='HTML')
+
+async def handle_add_webseries(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if not is_admin(update.effective_user.id):
+        return
 
+    try:
+        await add_webseries_with_episodes(update, " ".join(context.args), None)
     except Exception as e:
         logger.error(f"Error in handle_add_webseries: {e}", exc_info=True)
         await update.message.reply_text("⚠️ An error occurred. Check logs.")
 
+async def handle_add_webseries_document(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handles a text/CSV episode list uploaded with an /addwebseries caption."""
+    if not is_admin(update.effective_user.id):
+        return
+
+    try:
+        document = update.message.document
+        if document.file_size and document.file_size > MAX_EPISODE_FILE_SIZE:
+            await update.message.reply_text(f"❌ Episode file is too large (max {MAX_EPISODE_FILE_SIZE // 1024} KB).")
+            return
+
+        header_text = update.message.caption.split(maxsplit=1)
+        header_text = header_text[1] if len(header_text) > 1 else ""
+        telegram_file = await document.get_file()
+        content = await telegram_file.download_as_bytearray()
+        episodes_text = bytes(content).decode('utf-8-sig', errors='replace')
+        await add_webseries_with_episodes(update, header_text, episodes_text)
+    except Exception as e:
+        logger.error(f"Error in handle_add_webseries_document: {e}", exc_info=True)
+        await update.message.reply_text("⚠️ An error occurred. Check logs.")
+
 async def handle_request(update: Update, context: ContextTypes.DEFAULT_TYPE):
     try:
-        await db.add_user(update.effective_user.id)
+        user_registry.note(update.effective_user.id)
         if not context.args:
             await update.message.reply_text("❌ Please specify the movie you want to request. Usage: /request <movie name>")
             return
 
         movie_title = ' '.join(context.args)
         user_id = update.effective_user.id
-        await db.add_request(user_id, movie_title)
+        await db.add_request(user_id, movie_title, normalize_movie_name(movie_title))
         await update.message.reply_text(f"✅ Your request for '<b>{movie_title}</b>' has been logged.", parse_mode='HTML')
 
     except Exception as e:
@@ -1047,13 +1703,20 @@ async def handle_view_requests(update: Update, context: ContextTypes.DEFAULT_TYP
         return
 
     try:
-        requests = await db.get_requests()
+        if context.args and context.args[0].lower() == "rebuild":
+            if await db.rebuild_request_counts(normalize_movie_name):
+                await update.message.reply_text("✅ Request counts rebuilt from the request log.")
+            else:
+                await update.message.reply_text("⚠️ Rebuilding request counts failed. Check logs.")
+            return
+
+        requests = await db.get_requests(limit=10)
         if not requests:
             await update.message.reply_text("No movie requests at the moment.")
             return
 
         message = "<b>Movie Requests (Top 10):</b>\n\n"
-        for i, (title, count) in enumerate(requests[:10]):
+        for i, (title, count) in enumerate(requests):
             message += f"<b>{i+1}.</b> {title} (<i>{count} requests</i>)\n"
         
         await update.message.reply_text(message, parse_mode='HTML')
@@ -1064,9 +1727,9 @@ async def handle_view_requests(update: Update, context: ContextTypes.DEFAULT_TYP
 
 async def handle_browse(update: Update, context: ContextTypes.DEFAULT_TYPE):
     try:
-        await db.add_user(update.effective_user.id)
+        user_registry.note(update.effective_user.id)
         categories = sorted(list(set(CATEGORY_KEYWORDS)))
-        keyboard = [[InlineKeyboardButton(category, callback_data=f"browse_category_{category}_0")] for category in categories]
+        keyboard = [[InlineKeyboardButton(category, callback_data=browse_callback(category, 0))] for category in categories]
         
         reply_markup = InlineKeyboardMarkup(keyboard)
         await update.message.reply_text("Browse movies by category:", reply_markup=reply_markup)
@@ -1085,28 +1748,39 @@ async def handle_broadcast(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("❌ Please provide a message to broadcast. Usage: /broadcast <message>")
         return
 
-    user_ids = await db.get_all_user_ids()
-    if not user_ids:
-        await update.message.reply_text("No users found in the database to broadcast to.")
-        return
-
-    msg = await update.message.reply_text(f"📢 Starting broadcast to {len(user_ids)} users...")
+    # Store users that are still buffered so they receive the broadcast too.
+    await user_registry.flush()
+    msg = await update.message.reply_text("📢 Starting broadcast...")
 
     success_count = 0
     fail_count = 0
 
-    for user_id in user_ids:
-        try:
-            await context.bot.send_message(chat_id=user_id, text=message_to_broadcast, parse_mode='HTML')
-            success_count += 1
-        except (BadRequest, Forbidden) as e:
-            # BadRequest can happen if chat not found, Forbidden if user blocked the bot
-            logger.warning(f"Failed to send broadcast to {user_id}: {e}")
-            fail_count += 1
-        except Exception as e:
-            logger.error(f"An unexpected error occurred when broadcasting to {user_id}: {e}", exc_info=True)
-            fail_count += 1
-        await asyncio.sleep(0.1) # Small delay to avoid hitting rate limits
+    # Users are streamed page by page rather than loaded all at once.
+    try:
+        async for user_id in db.iter_user_ids():
+            try:
+                await context.bot.send_message(chat_id=user_id, text=message_to_broadcast, parse_mode='HTML')
+                success_count += 1
+            except (BadRequest, Forbidden) as e:
+                # BadRequest can happen if chat not found, Forbidden if user blocked the bot
+                logger.warning(f"Failed to send broadcast to {user_id}: {e}")
+                fail_count += 1
+            except Exception as e:
+                logger.error(f"An unexpected error occurred when broadcasting to {user_id}: {e}", exc_info=True)
+                fail_count += 1
+            await asyncio.sleep(0.1) # Small delay to avoid hitting rate limits
+    except RuntimeError as e:
+        logger.error(f"Broadcast stopped: {e}")
+        await msg.edit_text(
+            f"⚠️ Broadcast stopped because users could not be loaded.\n\n"
+            f"Sent successfully: {success_count}\n"
+            f"Failed to send: {fail_count}"
+        )
+        return
+
+    if success_count + fail_count == 0:
+        await msg.edit_text("No users found in the database to broadcast to.")
+        return
 
     summary_text = (
         f"✅ Broadcast complete!\n\n"
@@ -1136,6 +1810,13 @@ async def post_init_tasks(application: Application):
         logger.critical(f"Database initialization failed in post_init_tasks: {e}. The application will not start.")
         # Re-raising the exception will prevent the bot from starting.
         raise
+    await db.load_search_index()
+    http_clients.start()
+    user_registry.start()
+    if SHRINKME_API_KEY and SHORTEN_PREFETCH_RATE:
+        run_in_background(run_link_prefetch())
+    if db.DB_BACKEND == "replica":
+        run_in_background(db.run_replica_sync())
 
     # 2. Set Bot Commands
     user_commands = [
@@ -1170,6 +1851,15 @@ async def post_init_tasks(application: Application):
         asyncio.create_task(scrape_and_update_db())
     logger.info("Post-initialization tasks complete.")
 
+async def post_shutdown_tasks(application: Application):
+    """Releases resources once the bot has stopped polling."""
+    logger.info("Running post-shutdown tasks...")
+    await user_registry.close()
+    await http_clients.close()
+    await db.close_db()
+    metadata_cache.close()
+    short_urls.close()
+
 # --- Main Application ---
 def main() -> None:
     """Start the bot."""
@@ -1182,6 +1872,9 @@ def main() -> None:
         ApplicationBuilder()
         .token(BOT_TOKEN)
         .post_init(post_init_tasks)
+        .post_shutdown(post_shutdown_tasks)
+        # DB calls no longer block the loop, so let updates from different users overlap.
+        .concurrent_updates(True)
         .build()
     )
 
@@ -1204,6 +1897,10 @@ def main() -> None:
         application.add_handler(CommandHandler('refreshdb', refresh_db_command, filters=admin_filter))
         application.add_handler(CommandHandler('url', handle_add_url, filters=admin_filter))
         application.add_handler(CommandHandler('addwebseries', handle_add_webseries, filters=admin_filter))
+        application.add_handler(MessageHandler(
+            filters.Document.ALL & filters.CaptionRegex(r'^/addwebseries\b') & admin_filter,
+            handle_add_webseries_document,
+        ))
         application.add_handler(CommandHandler('viewrequests', handle_view_requests, filters=admin_filter))
         application.add_handler(CommandHandler('broadcast', handle_broadcast, filters=admin_filter))
 
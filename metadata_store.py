@@ -0,0 +1,75 @@
+import json
+import time
+
+from sqlite_lru import SqliteLRUStore
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS metadata (
+    key TEXT PRIMARY KEY,
+    found INTEGER NOT NULL,
+    data TEXT,
+    expires_at REAL NOT NULL,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS metadata_last_access_idx ON metadata (last_access);
+"""
+
+
+def metadata_key(cleaned_title: str, year: str | None) -> str:
+    """Cache key for an OMDb lookup: the cleaned title (case-insensitive) and year."""
+    return f"{' '.join(cleaned_title.lower().split())}|{year or ''}"
+
+
+class MetadataStore(SqliteLRUStore):
+    """
+    Persistent OMDb metadata cache in a small SQLite file. Found titles live for
+    'ttl' seconds and titles OMDb does not know for the shorter 'negative_ttl'.
+    Once the file holds more than 'max_entries' rows the least recently used ones
+    are evicted. A lookup is a primary-key read, plus at most one access-time write
+    per entry per TOUCH_INTERVAL, so it is cheap enough to run inline.
+    """
+
+    def __init__(self, path: str, ttl: float, negative_ttl: float, max_entries: int = 20000):
+        super().__init__(path, SCHEMA, "metadata", "key", max_entries)
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+
+    def get(self, key: str) -> tuple[bool, dict | None] | None:
+        """Returns (found, data) for a live entry, or None if there is none."""
+        row = self._conn.execute(
+            "SELECT found, data, expires_at, last_access FROM metadata WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        found, data, expires_at, last_access = row
+        if expires_at <= time.time():
+            with self._conn:
+                self._conn.execute("DELETE FROM metadata WHERE key = ?", (key,))
+            return None
+        self.touch([(key, last_access)])
+        return bool(found), json.loads(data) if data else None
+
+    def put(self, key: str, data: dict | None):
+        """Stores a found title's metadata, or a negative entry when 'data' is None."""
+        now = time.time()
+        ttl = self.ttl if data is not None else self.negative_ttl
+        with self._conn:
+            self._conn.execute(
+                """
+                INSERT INTO metadata (key, found, data, expires_at, last_access) VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (key) DO UPDATE SET
+                    found = excluded.found, data = excluded.data,
+                    expires_at = excluded.expires_at, last_access = excluded.last_access
+                """,
+                (key, data is not None, json.dumps(data) if data is not None else None, now + ttl, now),
+            )
+        self.note_write()
+
+    def delete_expired(self):
+        self._conn.execute("DELETE FROM metadata WHERE expires_at <= ?", (time.time(),))
+
+    def stats(self) -> dict:
+        found, missing = self._conn.execute(
+            "SELECT COALESCE(SUM(found), 0), COUNT(*) - COALESCE(SUM(found), 0) FROM metadata"
+        ).fetchone()
+        return {"found": found, "not_found": missing, "max_entries": self.max_entries}
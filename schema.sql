@@ -0,0 +1,98 @@
+-- Supabase tables used by database.py. Run in the SQL editor of a new project.
+
+create table if not exists movies (
+    id bigint generated by default as identity primary key,
+    name text not null unique,
+    url text not null,
+    type text not null,              -- 'file' or 'directory'
+    normalized_name text not null,
+    category text,
+    source text not null default 'scraped',  -- 'scraped' or 'manual'
+    last_updated bigint
+);
+create index if not exists movies_category_name_idx on movies (category, name);
+
+create table if not exists users (
+    user_id bigint primary key
+);
+
+create table if not exists requests (
+    id bigint generated by default as identity primary key,
+    user_id bigint not null,
+    movie_title text not null,
+    timestamp bigint
+);
+
+create table if not exists webseries (
+    id bigint generated by default as identity primary key,
+    name text not null,
+    category text,
+    poster_url text,
+    plot text,
+    normalized_name text not null,
+    last_updated bigint
+);
+create index if not exists webseries_name_idx on webseries (name);
+create index if not exists webseries_category_name_idx on webseries (category, name);
+
+create table if not exists episodes (
+    id bigint generated by default as identity primary key,
+    series_id bigint not null references webseries (id) on delete cascade,
+    season_number integer not null,
+    episode_number integer not null,
+    url text not null,
+    episode_name text,
+    unique (series_id, season_number, episode_number)
+);
+
+-- Movies and webseries as one relation, so search, browse and counts over both
+-- kinds take a single query. type_order breaks name ties (movies first).
+create or replace view catalog with (security_invoker = on) as
+    select id, name, 'movie' as type, 0 as type_order, category, normalized_name from movies
+    union all
+    select id, name, 'webseries' as type, 1 as type_order, category, normalized_name from webseries;
+
+-- Rows per type and category, so the bot's counts are one small query instead of
+-- a scan of the whole catalog.
+create or replace view catalog_category_counts with (security_invoker = on) as
+    select type, category, count(*) as row_count from catalog group by type, category;
+
+-- Recursive file listing of every indexed 'directory' movie.
+create table if not exists files (
+    id bigint generated by default as identity primary key,
+    movie_name text not null references movies (name) on delete cascade on update cascade,
+    position integer not null,
+    url text not null,
+    display_name text not null,
+    size text,
+    modified text,
+    last_seen bigint not null,
+    unique (movie_name, url)
+);
+create index if not exists files_movie_position_idx on files (movie_name, position);
+
+-- Per-title request totals, kept current by add_request so /viewrequests never
+-- scans the requests log. Titles are keyed by normalize_movie_name().
+create table if not exists request_counts (
+    normalized_title text primary key,
+    title text not null,             -- most recently requested spelling
+    request_count bigint not null default 0,
+    last_requested bigint
+);
+create index if not exists request_counts_top_idx on request_counts (request_count desc);
+
+-- Logs a request and bumps its title's total in one call, so both happen in the
+-- same transaction.
+drop function if exists increment_request_count(text, text, bigint);
+create or replace function log_request(
+    p_user_id bigint, p_title text, p_normalized_title text, p_timestamp bigint
+) returns void language sql as $$
+    insert into requests (user_id, movie_title, timestamp)
+    values (p_user_id, p_title, p_timestamp);
+    insert into request_counts (normalized_title, title, request_count, last_requested)
+    values (p_normalized_title, p_title, 1, p_timestamp)
+    on conflict (normalized_title) do update
+    set request_count = request_counts.request_count + 1,
+        title = excluded.title,
+        last_requested = excluded.last_requested;
+$$;
@@ -0,0 +1,80 @@
+import heapq
+from collections import defaultdict
+
+
+class InvertedIndex:
+    """
+    In-memory token -> posting list index over normalized names.
+    Documents are keyed by name (the unique key of the movies and webseries tables)
+    and get compact integer ids from the index itself, in insertion order.
+    """
+
+    def __init__(self):
+        self.loaded = False
+        self._doc_ids: dict[str, int] = {}
+        self._docs: dict[int, tuple[str, str, str | None, int | None]] = {}
+        self._postings: dict[str, set[int]] = defaultdict(set)
+        self._next_id = 0
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    def add(self, name: str, normalized_name: str, category: str | None = None, item_id: int | None = None):
+        """Adds a document, replacing any previous version with the same name. item_id is the row id."""
+        doc_id = self._doc_ids.get(name)
+        if doc_id is None:
+            doc_id = self._next_id
+            self._next_id += 1
+            self._doc_ids[name] = doc_id
+        else:
+            self._unlink(doc_id)
+
+        self._docs[doc_id] = (name, normalized_name, category, item_id)
+        for token in set(normalized_name.split()):
+            self._postings[token].add(doc_id)
+
+    def remove(self, name: str):
+        doc_id = self._doc_ids.pop(name, None)
+        if doc_id is not None:
+            self._unlink(doc_id)
+            del self._docs[doc_id]
+
+    def _unlink(self, doc_id: int):
+        normalized_name = self._docs[doc_id][1]
+        for token in set(normalized_name.split()):
+            posting = self._postings.get(token)
+            if posting is not None:
+                posting.discard(doc_id)
+                if not posting:
+                    del self._postings[token]
+
+    def search(self, normalized_query: str, limit: int = 15) -> list[dict]:
+        """
+        Returns [{"id", "name", "category"}] for documents containing every query word as a
+        whole word, the same semantics as the ilike filters in database.py. Results
+        are in insertion order.
+        """
+        words = set(normalized_query.split())
+        if not words:
+            return []
+
+        postings = []
+        for word in words:
+            posting = self._postings.get(word)
+            if not posting:
+                return []
+            postings.append(posting)
+
+        # Intersect starting from the rarest word to keep the working set small.
+        postings.sort(key=len)
+        matches = postings[0]
+        for posting in postings[1:]:
+            matches = matches & posting
+            if not matches:
+                return []
+
+        results = []
+        for doc_id in heapq.nsmallest(limit, matches):
+            name, _, category, item_id = self._docs[doc_id]
+            results.append({"id": item_id, "name": name, "category": category})
+        return results
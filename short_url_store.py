@@ -0,0 +1,54 @@
+import time
+
+from sqlite_lru import SqliteLRUStore
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS short_urls (
+    url TEXT PRIMARY KEY,
+    short_url TEXT NOT NULL,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS short_urls_last_access_idx ON short_urls (last_access);
+"""
+
+
+class ShortUrlStore(SqliteLRUStore):
+    """
+    Persistent map of long URLs to their shortened form in a small SQLite file.
+    Shortened links do not expire, so entries are only dropped, least recently
+    used first, once the file holds more than 'max_entries' of them.
+    """
+
+    def __init__(self, path: str, max_entries: int = 100000):
+        super().__init__(path, SCHEMA, "short_urls", "url", max_entries)
+
+    def get_many(self, urls: list[str]) -> dict[str, str]:
+        """Returns {url: short_url} for the given URLs that are stored."""
+        found = {}
+        accessed = []
+        # Stays well below SQLite's bound-parameter limit.
+        for start in range(0, len(urls), 500):
+            chunk = urls[start:start + 500]
+            rows = self._conn.execute(
+                f"SELECT url, short_url, last_access FROM short_urls WHERE url IN ({','.join('?' * len(chunk))})",
+                chunk,
+            ).fetchall()
+            for url, short_url, last_access in rows:
+                found[url] = short_url
+                accessed.append((url, last_access))
+        self.touch(accessed)
+        return found
+
+    def get(self, url: str) -> str | None:
+        return self.get_many([url]).get(url)
+
+    def put(self, url: str, short_url: str):
+        with self._conn:
+            self._conn.execute(
+                """
+                INSERT INTO short_urls (url, short_url, last_access) VALUES (?, ?, ?)
+                ON CONFLICT (url) DO UPDATE SET short_url = excluded.short_url, last_access = excluded.last_access
+                """,
+                (url, short_url, time.time()),
+            )
+        self.note_write()
@@ -0,0 +1,44 @@
+import asyncio
+from collections import Counter
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls that share a key: the first caller starts the
+    work as a task and later callers await the same task instead of repeating
+    it. Keys are tuples whose first element names the kind of work, which is
+    what stats() groups by. A caller that is cancelled does not cancel the
+    shared task, so the others (and any cache it fills) still get the result.
+    """
+
+    def __init__(self):
+        self._flights: dict[tuple, asyncio.Task] = {}
+        self.started = Counter()
+        self.coalesced = Counter()
+
+    async def run(self, key: tuple, func, *args, **kwargs):
+        task = self._flights.get(key)
+        if task is None:
+            task = asyncio.ensure_future(func(*args, **kwargs))
+            self._flights[key] = task
+            task.add_done_callback(lambda done: self._land(key, done))
+            self.started[key[0]] += 1
+        else:
+            self.coalesced[key[0]] += 1
+        return await asyncio.shield(task)
+
+    def _land(self, key: tuple, task: asyncio.Task):
+        if self._flights.get(key) is task:
+            del self._flights[key]
+        # Marks the exception as retrieved when every caller was cancelled.
+        if not task.cancelled():
+            task.exception()
+
+    def __len__(self) -> int:
+        return len(self._flights)
+
+    def stats(self) -> dict:
+        return {
+            kind: {"started": self.started[kind], "coalesced": self.coalesced[kind]}
+            for kind in sorted(set(self.started) | set(self.coalesced))
+        }
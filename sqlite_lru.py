@@ -0,0 +1,71 @@
+import time
+import sqlite3
+import logging
+
+logger = logging.getLogger(__name__)
+
+# A hit only rewrites last_access when the stored one is older than this (seconds),
+# so a repeat lookup is a single read.
+TOUCH_INTERVAL = 60 * 60
+
+
+class SqliteLRUStore:
+    """
+    Base for small persistent caches kept in their own SQLite file. 'table' must
+    have a 'key_column' primary key and a 'last_access' column; once it holds more
+    than 'max_entries' rows the least recently used ones are evicted. Subclasses
+    call touch() on hits and note_write() after each write, which trims the table
+    once per batch of writes since trimming counts it.
+    """
+
+    def __init__(self, path: str, schema: str, table: str, key_column: str, max_entries: int):
+        self.path = path
+        self.table = table
+        self.key_column = key_column
+        self.max_entries = max(1, max_entries)
+        self._conn = sqlite3.connect(path)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(schema)
+        self._writes_since_trim = 0
+
+    def touch(self, accessed: list[tuple[str, float]]):
+        """Records hits given as (key, stored last_access) pairs, skipping recent ones."""
+        now = time.time()
+        stale = [(now, key) for key, last_access in accessed if now - last_access > TOUCH_INTERVAL]
+        if stale:
+            with self._conn:
+                self._conn.executemany(
+                    f"UPDATE {self.table} SET last_access = ? WHERE {self.key_column} = ?", stale
+                )
+
+    def note_write(self):
+        self._writes_since_trim += 1
+        if self._writes_since_trim >= max(1, self.max_entries // 100):
+            self._writes_since_trim = 0
+            self.trim()
+
+    def delete_expired(self):
+        """Hook for stores whose entries expire; runs inside trim()'s transaction."""
+
+    def trim(self):
+        """Drops expired entries, then the least recently used ones above max_entries."""
+        with self._conn:
+            self.delete_expired()
+            excess = self._conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0] - self.max_entries
+            if excess > 0:
+                self._conn.execute(
+                    f"""
+                    DELETE FROM {self.table} WHERE {self.key_column} IN (
+                        SELECT {self.key_column} FROM {self.table} ORDER BY last_access LIMIT ?
+                    )
+                    """,
+                    (excess,),
+                )
+                logger.info(f"Evicted {excess} least recently used entries from {self.table}.")
+
+    def __len__(self) -> int:
+        return self._conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+
+    def close(self):
+        self._conn.close()
@@ -0,0 +1,75 @@
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class UserRegistry:
+    """
+    Write-behind registry of bot users. note() is synchronous and only touches
+    memory: ids already stored are ignored and new ones are buffered. The buffer
+    is written with one batched call to 'store' every 'interval' seconds, as soon
+    as it holds 'max_batch' ids, and on close(). Ids whose write failed stay
+    buffered for the next flush.
+    """
+
+    def __init__(self, store, max_batch: int = 100, interval: float = 10.0):
+        self.store = store
+        self.max_batch = max(1, max_batch)
+        self.interval = interval
+        self._known: set[int] = set()
+        self._pending: set[int] = set()
+        self._flush_now = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task: asyncio.Task | None = None
+
+    def note(self, user_id: int):
+        if user_id in self._known or user_id in self._pending:
+            return
+        self._pending.add(user_id)
+        if len(self._pending) >= self.max_batch:
+            self._flush_now.set()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._flush_now.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_now.clear()
+            await self.flush()
+
+    async def flush(self):
+        async with self._flush_lock:
+            if not self._pending:
+                return
+            batch = list(self._pending)
+            self._pending.clear()
+            stored = False
+            try:
+                stored = await self.store(batch)
+            except Exception as e:
+                logger.error(f"Error storing {len(batch)} users: {e}", exc_info=True)
+            finally:
+                # Also runs when the flush loop is cancelled mid-write.
+                if stored:
+                    self._known.update(batch)
+                else:
+                    self._pending.update(batch)
+
+    async def close(self):
+        """Stops the flush loop and writes whatever is still buffered."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+        if self._pending:
+            logger.warning(f"{len(self._pending)} new users could not be stored before shutdown.")